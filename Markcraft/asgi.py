@@ -13,4 +13,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Markcraft.settings')
 
+# Run under an ASGI server (e.g. `uvicorn Markcraft.asgi:application`) so the
+# dashboard event stream (/dashboard/events/) is served by the event loop rather
+# than holding a worker thread per open dashboard.
 application = get_asgi_application()
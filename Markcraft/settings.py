@@ -27,9 +27,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'base.sharding.SchoolMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,13 +64,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; compile once per process.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.teachers.current_teacher',
             ],
         },
     },
@@ -92,6 +100,51 @@ DATABASES = {
     }
 }
 
+# School databases ("shards"), e.g. DB_SHARDS=north,south. Each shard uses the
+# default connection settings unless DB_<ALIAS>_NAME / DB_<ALIAS>_HOST /
+# DB_<ALIAS>_PORT are set. Schools are assigned to shards with base.School.database.
+for alias in [alias.strip() for alias in os.getenv('DB_SHARDS', '').split(',') if alias.strip()]:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(f'DB_{alias.upper()}_NAME', f"{DATABASES['default']['NAME']}_{alias}"),
+        'HOST': os.getenv(f'DB_{alias.upper()}_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv(f'DB_{alias.upper()}_PORT', DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['base.sharding.SchoolRouter']
+
+
+# Cache
+# Fragment caches and the marks version token must be shared by every worker
+# process, so production should point this at memcached or redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        # Keys are namespaced by the active school
+        'KEY_FUNCTION': 'base.sharding.school_cache_key',
+    },
+    'sessions': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        'KEY_PREFIX': 'sessions',
+    },
+}
+
+
+# Sessions are read from the cache and written through to the database.
+# They use their own cache alias so they don't depend on the active school.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Loads User + Teacher + address + school in one query per request. ModelBackend
+# stays listed so sessions signed in before the switch still resolve.
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.TeacherModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -128,6 +181,48 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Hashed file names plus .gz/.br variants written at collectstatic time
+    'staticfiles': {
+        'BACKEND': 'base.storage.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
+# Release identifier mixed into page ETags, so a deploy stops clients revalidating
+# against pages that point at old asset hashes. Defaults to the static manifest hash.
+BUILD_ID = os.getenv('BUILD_ID', '')
+
+# Serve STATIC_ROOT from Django with far-future cache headers when no front-end
+# web server is configured to do it.
+SERVE_STATIC = os.getenv('SERVE_STATIC', 'False') == 'True'
+
+# Bundles written by `manage.py build_assets` (paths relative to ASSETS_DIR / static/)
+ASSETS_DIR = BASE_DIR / 'assets'
+ASSET_BUNDLES = {
+    'dist/markcraft.min.css': [
+        'vendor/bootstrap-4.5.3/bootstrap.min.css',
+        'vendor/material-icons/material-icons.css',
+        'css/markcraft.css',
+    ],
+    'dist/markcraft.min.js': [
+        'vendor/jquery-3.5.1/jquery.slim.min.js',
+        'vendor/bootstrap-4.5.3/bootstrap.bundle.min.js',
+        'js/dashboard.js',
+    ],
+}
+ASSET_FILES = {
+    'dist/fonts/MaterialIcons-Regular.woff2': 'vendor/material-icons/MaterialIcons-Regular.woff2',
+}
+
+# Uploaded mark sheets
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
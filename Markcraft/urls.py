@@ -14,8 +14,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from base.static_views import serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -23,3 +26,8 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     # path('accounts/', include('django.contrib.auth.urls')),
 ]
+
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class TeacherModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user's Teacher profile, address and school in
+    the same query as the user, so request.user.teacher costs nothing extra.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('teacher__address', 'teacher__school').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
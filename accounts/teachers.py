@@ -0,0 +1,19 @@
+def get_current_teacher(request):
+    """
+    Returns the Teacher profile of the signed-in user, or None.
+    The result is memoized on the request; with TeacherModelBackend the profile
+    arrives with request.user, so this never runs a query of its own.
+    """
+    if not hasattr(request, '_current_teacher'):
+        user = request.user
+        # A missing profile raises RelatedObjectDoesNotExist, an AttributeError
+        request._current_teacher = getattr(user, 'teacher', None) if user.is_authenticated else None
+    return request._current_teacher
+
+
+def current_teacher(request):
+    """
+    Template context processor exposing ``current_teacher``.
+    Passed as a callable so pages that don't use it don't evaluate it.
+    """
+    return {'current_teacher': lambda: get_current_teacher(request)}
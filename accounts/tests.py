@@ -1,3 +1,64 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user
+from django.contrib.auth.models import AnonymousUser, User
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase
+
+from base.models import AddressZW, School, Teacher
+from .backends import TeacherModelBackend
+from .teachers import get_current_teacher
+
+
+class CurrentTeacherTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teacher', password='secret')
+        Teacher.objects.create(
+            user=self.user, date_of_birth=datetime.date(1980, 1, 1), gender='F', national_id='NID-T1',
+            phone_number='0770000000', qualifications='BEd', years_of_experience=5,
+            school=School.objects.create(code='north', name='North High', database='default'),
+            address=AddressZW.objects.create(address_line_1='1 Main Road', city='Harare', province='Harare',
+                                             postal_code='0000'),
+        )
+
+    def request_for(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def signed_in(self, user):
+        # Loads request.user the way AuthenticationMiddleware does
+        with self.assertNumQueries(1):
+            return self.request_for(TeacherModelBackend().get_user(user.pk))
+
+    def test_profile_arrives_with_the_user(self):
+        request = self.signed_in(self.user)
+        with self.assertNumQueries(0):
+            teacher = get_current_teacher(request)
+            self.assertEqual((teacher.school.code, teacher.address.city), ('north', 'Harare'))
+            self.assertIs(get_current_teacher(request), teacher)
+
+    def test_context_processor_runs_no_queries(self):
+        request = self.signed_in(self.user)
+        with self.assertNumQueries(0):
+            Template('{{ request.path }}').render(RequestContext(request))
+        self.assertFalse(hasattr(request, '_current_teacher'))
+
+        template = Template('{{ current_teacher.school.name }}, {{ current_teacher.address.city }}')
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(RequestContext(request)), 'North High, Harare')
+
+    def test_users_without_a_profile(self):
+        request = self.signed_in(User.objects.create_user(username='clerk', password='secret'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_current_teacher(request))
+            self.assertIsNone(get_current_teacher(self.request_for(AnonymousUser())))
+
+    def test_sessions_from_before_the_teacher_backend(self):
+        self.client.login(username='teacher', password='secret')
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'accounts.backends.TeacherModelBackend')
+
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertEqual(get_user(request), self.user)
@@ -0,0 +1,64 @@
+/* Live dashboard statistics over server-sent events (base.mark_views.dashboard_events).
+ * The server sends a snapshot on connect and after updates/deletes, and a delta
+ * for newly created marks; the totals are kept here and re-rendered. Every event
+ * carries the marks version it reflects, and events no newer than the current
+ * state (e.g. a change already counted in the first snapshot) are dropped. */
+(function () {
+    var root = document.querySelector('[data-live-stats]');
+    if (!root || !window.EventSource) {
+        return;
+    }
+
+    var state = null;
+
+    function isStale(event) {
+        return state !== null && event.version !== null && state.version !== null && event.version <= state.version;
+    }
+
+    function format(value) {
+        return value === null ? 'None' : (Math.round(value * 100) / 100).toString();
+    }
+
+    function render() {
+        var values = {
+            total_students: state.total_students,
+            total_marks: state.total_marks,
+            average_mark: state.total_marks ? format(state.sum / state.total_marks) : 'None',
+            highest_mark: format(state.highest_mark),
+            lowest_mark: format(state.lowest_mark)
+        };
+        Object.keys(values).forEach(function (name) {
+            var element = root.querySelector('[data-stat="' + name + '"]');
+            if (element) {
+                element.textContent = values[name];
+            }
+        });
+    }
+
+    var source = new EventSource(root.getAttribute('data-live-stats'));
+
+    source.addEventListener('snapshot', function (event) {
+        var snapshot = JSON.parse(event.data);
+        if (isStale(snapshot)) {
+            return;
+        }
+        state = snapshot;
+        render();
+    });
+
+    source.addEventListener('delta', function (event) {
+        if (!state) {
+            return;
+        }
+        var delta = JSON.parse(event.data);
+        if (isStale(delta)) {
+            return;
+        }
+        state.version = delta.version;
+        state.total_marks += delta.count;
+        state.sum = (state.sum || 0) + delta.sum;
+        state.highest_mark = state.highest_mark === null ? delta.highest_mark : Math.max(state.highest_mark, delta.highest_mark);
+        state.lowest_mark = state.lowest_mark === null ? delta.lowest_mark : Math.min(state.lowest_mark, delta.lowest_mark);
+        render();
+    });
+})();
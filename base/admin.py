@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import AddressZW, Stream, Course, Program, Student, Teacher, Mark
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import Q
+from .models import AddressZW, Stream, Course, Program, Student, School, Teacher, Mark, MarkAudit, MarkUpload, Assessment, FinalGrade
 
 
 class AddressZWAdmin(admin.ModelAdmin):
@@ -12,37 +16,161 @@ class StreamAdmin(admin.ModelAdmin):
     search_fields = ['name']
     date_hierarchy = 'start_date'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_is_active()
+
+    @admin.display(boolean=True, ordering='active', description='Is active')
+    def is_active(self, obj):
+        return obj.active
+
+class AssessmentInline(admin.TabularInline):
+    model = Assessment
+    extra = 0
+    fields = ['name', 'kind', 'weight', 'max_mark']
+
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['code', 'name', 'description', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['code', 'name', 'description']
+    inlines = [AssessmentInline]
 
 class ProgramAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description', 'total_courses']
+    list_display = ['name', 'description', 'total_courses', 'total_students']
     search_fields = ['name', 'description']
     filter_horizontal = ['courses']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
+    @admin.display(ordering='course_count', description='Total courses')
+    def total_courses(self, obj):
+        return obj.course_count
+
+    @admin.display(ordering='student_count', description='Total students')
+    def total_students(self, obj):
+        return obj.student_count
+
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['student_id', 'first_name', 'last_name', 'program', 'gender', 'national_id', 'phone_number']
     list_filter = ['program', 'gender', 'class_year']
     search_fields = ['student_id', 'first_name', 'last_name', 'national_id', 'phone_number']
 
+class SchoolAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'database']
+    search_fields = ['code', 'name']
+
 class TeacherAdmin(admin.ModelAdmin):
-    list_display = ['user', 'date_of_birth', 'gender', 'national_id', 'phone_number', 'address', 'qualifications', 'years_of_experience']
-    list_filter = ['gender']
+    list_display = ['user', 'school', 'date_of_birth', 'gender', 'national_id', 'phone_number', 'address', 'qualifications', 'years_of_experience']
+    list_filter = ['school', 'gender']
     search_fields = ['user__first_name', 'user__last_name', 'national_id', 'phone_number']
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Teachers and their addresses live in the default database, whichever school is active
+        kwargs['using'] = DEFAULT_DB_ALIAS
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 class MarkAdmin(admin.ModelAdmin):
-    list_display = ['student', 'course', 'mark', 'recorded_at']
-    list_filter = ['course',]
+    list_display = ['student', 'course', 'assessment', 'mark', 'recorded_at']
+    list_filter = ['course', 'assessment__kind']
     search_fields = ['student__first_name', 'student__last_name']
 
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic(using=router.db_for_write(Mark)):
+            old_value = None
+            if change:
+                old_value = Mark.objects.filter(pk=obj.pk).values_list('mark', flat=True).first()
+            super().save_model(request, obj, form, change)
+            action = MarkAudit.UPDATED if change else MarkAudit.CREATED
+            MarkAudit.entry_for(obj, action, old_value=old_value, user=request.user).save()
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(using=router.db_for_write(Mark)):
+            MarkAudit.entry_for(obj, MarkAudit.DELETED, old_value=obj.mark, user=request.user).save()
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(using=router.db_for_write(Mark)):
+            MarkAudit.objects.bulk_create([
+                MarkAudit.entry_for(mark, MarkAudit.DELETED, old_value=mark.mark, user=request.user)
+                for mark in queryset
+            ])
+            super().delete_queryset(request, queryset)
+
+class FinalGradeAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'final_mark', 'grade', 'computed_at']
+    list_filter = ['grade', 'course', 'student__class_year']
+    search_fields = ['student__first_name', 'student__last_name', 'student__student_id']
+    list_select_related = ['student', 'course']
+    readonly_fields = ['student', 'course', 'final_mark', 'grade', 'computed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+class MarkUploadAdmin(admin.ModelAdmin):
+    list_display = ['original_name', 'sha256', 'size', 'compressed', 'uploaded_by', 'uploaded_at']
+    list_filter = ['compressed']
+    search_fields = ['original_name', 'sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'compressed', 'uploaded_by', 'uploaded_at']
+
+class MarkAuditChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Users live in the default database, so they can't be joined; load a page's users in one query
+        users = User.objects.in_bulk({entry.changed_by_id for entry in self.result_list if entry.changed_by_id})
+        field = MarkAudit._meta.get_field('changed_by')
+        for entry in self.result_list:
+            field.set_cached_value(entry, users.get(entry.changed_by_id))
+
+
+class MarkAuditAdmin(admin.ModelAdmin):
+    list_display = ['changed_at', 'action', 'audited_student', 'audited_course', 'old_value', 'new_value', 'changed_by']
+    list_filter = ['action', 'course']
+    search_fields = ['student__first_name', 'student__last_name']
+    list_select_related = ['student', 'course']
+    date_hierarchy = 'changed_at'
+
+    def get_changelist(self, request, **kwargs):
+        return MarkAuditChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return matches, may_have_duplicates
+        user_ids = list(User.objects.filter(username__icontains=search_term).values_list('pk', flat=True))
+        return queryset.filter(Q(pk__in=matches.values('pk')) | Q(changed_by_id__in=user_ids)), False
+
+    # Entries keep the ids of deleted students and courses
+    @admin.display(ordering='student', description='Student')
+    def audited_student(self, obj):
+        if obj.student is None and obj.student_id is not None:
+            return f'{obj.student_id} (deleted)'
+        return obj.student
+
+    @admin.display(ordering='course', description='Course')
+    def audited_course(self, obj):
+        if obj.course is None and obj.course_id is not None:
+            return f'{obj.course_id} (deleted)'
+        return obj.course
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Register your models with the custom admin classes
 admin.site.register(AddressZW, AddressZWAdmin)
 admin.site.register(Stream, StreamAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(Program, ProgramAdmin)
 admin.site.register(Student, StudentAdmin)
+admin.site.register(School, SchoolAdmin)
 admin.site.register(Teacher, TeacherAdmin)
 admin.site.register(Mark, MarkAdmin)
+admin.site.register(FinalGrade, FinalGradeAdmin)
+admin.site.register(MarkUpload, MarkUploadAdmin)
+admin.site.register(MarkAudit, MarkAuditAdmin)
 
@@ -0,0 +1,167 @@
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .events import marks_delta, publish_marks_change
+from .models import Assessment, Course, Mark, Student
+from .sharding import current_school, use_school
+
+MARKS_VERSION_KEY = 'base:marks-version'
+RECORDS_VERSION_KEY = 'base:records-version'
+RECORDS_CHANGED_AT_KEY = 'base:records-changed-at'
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses an old token.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _version(key)
+        return cache.incr(key)
+
+
+def marks_version():
+    """
+    Returns a token that changes every time a mark is created, updated or deleted.
+    Used to key cached fragments and pages that depend on marks.
+    """
+    return _version(MARKS_VERSION_KEY)
+
+
+def bump_marks_version():
+    """
+    Advances the marks version token, invalidating everything keyed on it.
+    """
+    return _bump(MARKS_VERSION_KEY)
+
+
+def records_version():
+    """
+    Returns a token that changes every time a student or course is created,
+    updated or deleted. Pages showing student or course data key on it next
+    to the marks version.
+    """
+    return _version(RECORDS_VERSION_KEY)
+
+
+def bump_records_version():
+    """
+    Advances the records version token, invalidating everything keyed on it.
+    """
+    return _bump(RECORDS_VERSION_KEY)
+
+
+def records_changed():
+    """
+    Records that students or courses changed once the current transaction
+    commits. Bulk operations, which don't send model signals, call this directly.
+    """
+    school = current_school()
+
+    def committed():
+        with use_school(school):
+            cache.set(RECORDS_CHANGED_AT_KEY, timezone.now(), None)
+            bump_records_version()
+
+    transaction.on_commit(committed, using=router.db_for_write(Student))
+
+
+def marks_changed(delta=None):
+    """
+    Records that marks changed once the current transaction commits, and
+    notifies open dashboards. Bulk operations, which don't send model signals,
+    call this directly.
+    Parameters:
+        - delta (dict): Statistics delta of newly created marks (see events.marks_delta);
+          None when marks were updated or deleted.
+    """
+    school = current_school()
+
+    def committed():
+        with use_school(school):
+            version = bump_marks_version()
+            publish_marks_change(delta, version)
+
+    transaction.on_commit(committed, using=router.db_for_write(Mark))
+
+
+def marks_etag(request, *args, **kwargs):
+    """
+    ETag for pages built from marks, students and courses, for use with
+    ``django.views.decorators.http.condition``.
+    Costs no queries: it combines the marks and records version tokens with the
+    current user, since pages also show who is signed in, and the build, since
+    pages link to fingerprinted assets.
+    """
+    return f'marks-{build_id()}-{marks_version()}-{records_version()}-{request.user.pk or 0}'
+
+
+def build_id():
+    """
+    Returns the identifier of the deployed release: the BUILD_ID setting, or
+    the hash of the collected static files manifest when that is not set.
+    """
+    return settings.BUILD_ID or getattr(staticfiles_storage, 'manifest_hash', '')
+
+
+def marks_last_modified(request, *args, **kwargs):
+    """
+    Last-Modified for pages built from marks, students and courses: the latest
+    mark, course or student change. The value is cached per pair of version
+    tokens, so the aggregate queries only run once after each change.
+    """
+    key = f'base:marks-last-modified:{marks_version()}:{records_version()}'
+    return cache.get_or_set(key, _latest_change, None)
+
+
+def _latest_change():
+    latest = [
+        Mark.objects.aggregate(latest=Max('recorded_at'))['latest'],
+        Course.objects.aggregate(latest=Max('updated_at'))['latest'],
+        # Students carry no timestamp; records_changed notes when they last changed
+        cache.get(RECORDS_CHANGED_AT_KEY),
+    ]
+    latest = [value for value in latest if value is not None]
+    return max(latest) if latest else None
+
+
+@receiver(post_save, sender=Mark)
+def _mark_saved(sender, instance, created, **kwargs):
+    marks_changed(marks_delta([instance]) if created else None)
+
+
+@receiver(post_delete, sender=Mark)
+def _mark_deleted(sender, **kwargs):
+    marks_changed()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def _record_changed(sender, **kwargs):
+    records_changed()
+
+
+@receiver(post_save, sender=Assessment)
+@receiver(post_delete, sender=Assessment)
+def _assessment_changed(sender, instance, **kwargs):
+    # Weights are relative to the course's other assessments, so adding,
+    # removing or re-weighting one makes all of the course's final grades stale.
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+    records_changed()
@@ -0,0 +1,123 @@
+"""
+In-process publish/subscribe for live dashboard updates.
+
+Subscribers are server-sent-event streams running on the ASGI event loop; each
+owns an asyncio.Queue and listens on the channel of its school. Publishing is
+thread-safe, so synchronous code (views run in a thread pool, imports, signal
+handlers) can publish directly. One change is fanned out to every open
+dashboard of the school in this process without any per-dashboard query.
+"""
+import asyncio
+import threading
+
+from django.db.models import Count, Max, Min, Sum
+
+from .models import Mark, Student
+from .sharding import current_school
+
+MAX_PENDING_EVENTS = 100
+
+
+class Broker:
+    """
+    Fans events out to the queues of all current subscribers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, channel=None):
+        """
+        Registers a subscriber to a channel on the running event loop.
+        Returns the asyncio.Queue the subscriber reads events from.
+        """
+        queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        with self._lock:
+            self._subscribers.add((channel, asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {subscriber for subscriber in self._subscribers if subscriber[2] is not queue}
+
+    def has_subscribers(self, channel=None):
+        with self._lock:
+            return any(subscriber[0] == channel for subscriber in self._subscribers)
+
+    def publish(self, event, channel=None):
+        """
+        Delivers an event to every subscriber of a channel. Safe to call from any thread.
+        """
+        with self._lock:
+            subscribers = [(loop, queue) for c, loop, queue in self._subscribers if c == channel]
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue, event):
+    # A client that stopped reading gets a snapshot instead of an ever-growing backlog.
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'type': 'resync'})
+    else:
+        queue.put_nowait(event)
+
+
+broker = Broker()
+
+
+def mark_statistics():
+    """
+    Returns the dashboard statistics as a JSON-serializable snapshot.
+    """
+    stats = Mark.objects.aggregate(count=Count('id'), sum=Sum('mark'), highest=Max('mark'), lowest=Min('mark'))
+    return {
+        'type': 'snapshot',
+        'total_students': Student.objects.count(),
+        'total_marks': stats['count'],
+        'sum': _number(stats['sum']),
+        'highest_mark': _number(stats['highest']),
+        'lowest_mark': _number(stats['lowest']),
+    }
+
+
+def marks_delta(marks):
+    """
+    Builds a delta event for newly created marks without querying the database.
+    Parameters:
+        - marks (list of Mark): Marks that were just created.
+    """
+    # Values are coerced as on save: marks may be created from strings
+    field = Mark._meta.get_field('mark')
+    values = [field.to_python(mark.mark) for mark in marks]
+    return {
+        'type': 'delta',
+        'count': len(values),
+        'sum': _number(sum(values)),
+        'highest_mark': _number(max(values)),
+        'lowest_mark': _number(min(values)),
+    }
+
+
+def school_channel(school):
+    return school.code if school is not None else None
+
+
+def publish_marks_change(delta=None, version=None):
+    """
+    Publishes a committed mark change to the open dashboards of the active school.
+    Creations are sent as a delta; updates and deletes, which can't be applied
+    incrementally, as a fresh snapshot (one query, shared by all subscribers).
+    """
+    channel = school_channel(current_school())
+    if not broker.has_subscribers(channel):
+        return
+    event = dict(delta) if delta is not None else mark_statistics()
+    event['version'] = version
+    broker.publish(event, channel)
+
+
+def _number(value):
+    return None if value is None else float(value)
@@ -13,4 +13,6 @@ class LoginForm(forms.Form):
 
 
 class MarkUploadForm(forms.Form):
-    file = forms.FileField(label='Upload File', help_text='Upload file containing student marks')
\ No newline at end of file
+    file = forms.FileField(label='Upload File', help_text='Upload file containing student marks')
+    reimport = forms.BooleanField(required=False, label='Import again',
+                                  help_text='Import the marks even if this sheet was imported before')
\ No newline at end of file
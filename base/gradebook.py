@@ -0,0 +1,228 @@
+"""
+Compact student x course grid of a stream's marks.
+
+Cells are held in a flat ``array('d')`` (row-major, one row per student, one
+column per course) with a parallel ``bytearray`` marking which cells have a
+mark, so a stream of thousands of marks costs nine bytes per cell instead of a
+Mark instance per mark.
+"""
+import csv
+import math
+from array import array
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Avg, F, FloatField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Course, Mark, Student
+
+
+class Gradebook:
+    """
+    Student x course matrix of marks (percentages) with a missing-value mask.
+    Rows are (pk, student_id, name) tuples, columns (pk, code) tuples.
+    """
+
+    def __init__(self, students, courses, values=None, present=None):
+        self.students = list(students)
+        self.courses = list(courses)
+        size = len(self.students) * len(self.courses)
+        self.values = values if values is not None else array('d', bytes(8 * size))
+        self.present = present if present is not None else bytearray(size)
+        self._student_index = {student[0]: i for i, student in enumerate(self.students)}
+        self._course_index = {course[0]: j for j, course in enumerate(self.courses)}
+
+    @classmethod
+    def for_stream(cls, stream, kind=None):
+        """
+        Loads the gradebook of a stream.
+        Each cell is the student's mark in the course as a percentage: marks are
+        scaled by their assessment's max mark, averaged per assessment, and the
+        assessments combined by weight. Marks without an assessment are out of
+        100 and together count as one assessment of weight 1. Marks are read
+        with one grouped values_list query and written straight into the arrays.
+        Parameters:
+            - stream (Stream): Stream whose students form the rows.
+            - kind (str): Only count marks of this assessment kind (see Assessment.KIND_CHOICES).
+        Returns a Gradebook.
+        """
+        marks = Mark.objects.filter(student__class_year=stream)
+        if kind:
+            marks = marks.filter(assessment__kind=kind)
+
+        students = [
+            (pk, student_id, f'{first_name} {last_name}')
+            for pk, student_id, first_name, last_name in Student.objects.filter(class_year=stream)
+            .order_by('last_name', 'first_name', 'pk').values_list('pk', 'student_id', 'first_name', 'last_name')
+        ]
+        courses = list(Course.objects.filter(pk__in=marks.values('course_id')).order_by('code').values_list('pk', 'code'))
+        gradebook = cls(students, courses)
+
+        width = len(courses)
+        rows, columns = gradebook._student_index, gradebook._course_index
+        percentage = F('mark') * 100 / Coalesce('assessment__max_mark', Value(Decimal(100)))
+        cells = (marks.values('student_id', 'course_id', 'assessment_id')
+                 .annotate(average=Avg(percentage, output_field=FloatField())).order_by())
+        # offset -> [sum of weighted averages, sum of weights]
+        totals = defaultdict(lambda: [0.0, 0.0])
+        for student_id, course_id, weight, average in cells.values_list(
+                'student_id', 'course_id', 'assessment__weight', 'average').iterator():
+            weight = 1.0 if weight is None else float(weight)
+            total = totals[rows[student_id] * width + columns[course_id]]
+            total[0] += float(average) * weight
+            total[1] += weight
+        for offset, (weighted, weights) in totals.items():
+            if weights:
+                gradebook.values[offset] = weighted / weights
+                gradebook.present[offset] = 1
+        return gradebook
+
+    @property
+    def shape(self):
+        return len(self.students), len(self.courses)
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the cell arrays, in bytes.
+        """
+        return len(self.values) * self.values.itemsize + len(self.present)
+
+    def missing(self):
+        """
+        Returns the number of cells without a mark.
+        """
+        return self.present.count(0)
+
+    def get(self, student, course):
+        """
+        Returns the mark of a student (pk) in a course (pk), or None when missing.
+        """
+        offset = self._student_index[student] * len(self.courses) + self._course_index[course]
+        return self.values[offset] if self.present[offset] else None
+
+    def row(self, student):
+        """
+        Returns a student's marks (pk) in column order, None where missing.
+        """
+        start = self._student_index[student] * len(self.courses)
+        return self._cells(range(start, start + len(self.courses)))
+
+    def column(self, course):
+        """
+        Returns a course's marks (pk) in row order, None where missing.
+        """
+        width = len(self.courses)
+        return self._cells(range(self._course_index[course], len(self.values), width))
+
+    def _cells(self, offsets):
+        values, present = self.values, self.present
+        return [values[offset] if present[offset] else None for offset in offsets]
+
+    def select(self, students=None, courses=None):
+        """
+        Slices the gradebook down to some students and/or courses.
+        Whole rows are copied as array slices.
+        Parameters:
+            - students (iterable of int): Student pks to keep, in the wanted order (default: all).
+            - courses (iterable of int): Course pks to keep, in the wanted order (default: all).
+        Returns a new Gradebook.
+        """
+        width = len(self.courses)
+        rows = range(len(self.students)) if students is None else [self._student_index[pk] for pk in students]
+        columns = None if courses is None else [self._course_index[pk] for pk in courses]
+
+        values, present = array('d'), bytearray()
+        for i in rows:
+            start = i * width
+            if columns is None:
+                values.extend(self.values[start:start + width])
+                present.extend(self.present[start:start + width])
+            else:
+                values.extend(self.values[start + j] for j in columns)
+                present.extend(self.present[start + j] for j in columns)
+        return Gradebook(
+            [self.students[i] for i in rows],
+            self.courses if columns is None else [self.courses[j] for j in columns],
+            values, present,
+        )
+
+    def row_stats(self):
+        """
+        Returns {student pk: statistics} over each student's marks.
+        """
+        width = len(self.courses)
+        return {
+            student[0]: _statistics(self.values, self.present, range(i * width, (i + 1) * width))
+            for i, student in enumerate(self.students)
+        }
+
+    def column_stats(self):
+        """
+        Returns {course pk: statistics} over each course's marks.
+        """
+        width = len(self.courses)
+        return {
+            course[0]: _statistics(self.values, self.present, range(j, len(self.values), width))
+            for j, course in enumerate(self.courses)
+        }
+
+    def to_dict(self):
+        """
+        Returns a JSON-serializable representation for the dashboard.
+        """
+        width = len(self.courses)
+        marks = [
+            [None if value is None else round(value, 2) for value in self._cells(range(i * width, (i + 1) * width))]
+            for i in range(len(self.students))
+        ]
+        column_stats = self.column_stats()
+        return {
+            'students': [{'id': pk, 'student_id': student_id, 'name': name} for pk, student_id, name in self.students],
+            'courses': [
+                {'id': pk, 'code': code, **_rounded(column_stats[pk])} for pk, code in self.courses
+            ],
+            'marks': marks,
+            'missing': self.missing(),
+        }
+
+    def write_csv(self, file):
+        """
+        Writes the gradebook as CSV: one row per student, one column per course code.
+        Missing marks are left empty.
+        """
+        writer = csv.writer(file)
+        writer.writerow(['Student ID', 'Name'] + [code for _, code in self.courses])
+        width = len(self.courses)
+        for i, (_, student_id, name) in enumerate(self.students):
+            cells = self._cells(range(i * width, (i + 1) * width))
+            writer.writerow([student_id, name] + ['' if value is None else f'{value:.2f}' for value in cells])
+
+
+def _statistics(values, present, offsets):
+    count = 0
+    total = squares = 0.0
+    lowest, highest = math.inf, -math.inf
+    for offset in offsets:
+        if present[offset]:
+            value = values[offset]
+            count += 1
+            total += value
+            squares += value * value
+            lowest = min(lowest, value)
+            highest = max(highest, value)
+    if not count:
+        return {'count': 0, 'average': None, 'stdev': None, 'lowest': None, 'highest': None}
+    average = total / count
+    return {
+        'count': count,
+        'average': average,
+        'stdev': math.sqrt(max(squares / count - average * average, 0.0)),
+        'lowest': lowest,
+        'highest': highest,
+    }
+
+
+def _rounded(stats):
+    return {key: value if value is None or key == 'count' else round(value, 2) for key, value in stats.items()}
@@ -0,0 +1,136 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Avg, Exists, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Assessment, FinalGrade, Mark, MarkAudit, Student
+
+# (minimum final mark, grade), highest band first. Override with settings.GRADE_BANDS.
+DEFAULT_GRADE_BANDS = [
+    (70, 'A'),
+    (60, 'B'),
+    (50, 'C'),
+    (40, 'D'),
+    (30, 'E'),
+    (0, 'U'),
+]
+
+TWO_PLACES = Decimal('0.01')
+
+
+def grade_bands():
+    return getattr(settings, 'GRADE_BANDS', DEFAULT_GRADE_BANDS)
+
+
+def grade_for(final_mark):
+    """
+    Returns the grade band of a final mark.
+    """
+    for minimum, grade in grade_bands():
+        if final_mark >= minimum:
+            return grade
+    return grade_bands()[-1][1]
+
+
+def compute_final_marks(students):
+    """
+    Computes weighted final marks for a set of students in one grouped query.
+    Each assessment contributes (average mark / max mark) * weight; the sum is
+    scaled by the course's total assessment weight, so a missed assessment counts as zero.
+    Parameters:
+        - students (QuerySet of Student): Students to compute.
+    Returns a dict {(student_id, course_id): final mark out of 100}.
+    """
+    per_assessment = (
+        Mark.objects.filter(student__in=students, assessment__isnull=False)
+        .values('student_id', 'assessment_id', 'assessment__course_id', 'assessment__weight', 'assessment__max_mark')
+        .annotate(average=Avg('mark'))
+    )
+    course_ids = set()
+    weighted = defaultdict(Decimal)
+    for row in per_assessment:
+        course_id = row['assessment__course_id']
+        course_ids.add(course_id)
+        weighted[row['student_id'], course_id] += (
+            Decimal(str(row['average'])) / row['assessment__max_mark'] * row['assessment__weight']
+        )
+
+    course_weights = dict(
+        Assessment.objects.filter(course_id__in=course_ids)
+        .values('course_id').annotate(total=Sum('weight')).values_list('course_id', 'total')
+    )
+    return {
+        key: (score * 100 / course_weights[key[1]]).quantize(TWO_PLACES, ROUND_HALF_UP)
+        for key, score in weighted.items() if course_weights.get(key[1])
+    }
+
+
+def changed_students(stream):
+    """
+    Finds students of a stream whose final grades are out of date: a mark was
+    recorded or audited after their grade was computed, the course's assessments
+    were added, removed or re-weighted (which touches Course.updated_at), or they
+    have assessed marks but no grade yet.
+    Returns a queryset of student ids.
+    """
+    computed_at = FinalGrade.objects.filter(
+        student_id=OuterRef('student_id'), course_id=OuterRef('course_id'),
+    ).values('computed_at')[:1]
+
+    stale_marks = Mark.objects.filter(
+        student__class_year=stream, assessment__isnull=False,
+    ).annotate(computed_at=Subquery(computed_at)).filter(
+        Q(computed_at__isnull=True) | Q(recorded_at__gt=F('computed_at'))
+    )
+    # Assessment changes alter the weighting of every grade in the course
+    regraded = FinalGrade.objects.filter(
+        student__class_year=stream, course__updated_at__gt=F('computed_at'),
+    )
+    # Updates and deletes of marks behind an existing grade
+    audited = MarkAudit.objects.filter(
+        student__class_year=stream,
+    ).annotate(computed_at=Subquery(computed_at)).filter(changed_at__gt=F('computed_at'))
+    return Student.objects.filter(class_year=stream).filter(
+        Exists(stale_marks.filter(student_id=OuterRef('pk')))
+        | Exists(audited.filter(student_id=OuterRef('pk')))
+        | Exists(regraded.filter(student_id=OuterRef('pk')))
+    ).values('pk')
+
+
+def compute_stream_grades(stream, full=False):
+    """
+    Computes and stores final grades for a stream.
+    Only students whose marks changed since their grades were last computed are
+    recomputed unless ``full`` is set.
+    Parameters:
+        - stream (Stream): Stream to grade.
+        - full (bool): Recompute every student of the stream.
+    Returns the number of students recomputed.
+    """
+    now = timezone.now()
+    if full:
+        student_ids = list(Student.objects.filter(class_year=stream).values_list('pk', flat=True))
+    else:
+        student_ids = list(changed_students(stream).values_list('pk', flat=True))
+    if not student_ids:
+        return 0
+
+    final_marks = compute_final_marks(Student.objects.filter(pk__in=student_ids))
+    grades = [
+        FinalGrade(student_id=student_id, course_id=course_id, final_mark=final_mark,
+                   grade=grade_for(final_mark), computed_at=now)
+        for (student_id, course_id), final_mark in final_marks.items()
+    ]
+    with transaction.atomic(using=router.db_for_write(FinalGrade)):
+        FinalGrade.objects.bulk_create(
+            grades,
+            update_conflicts=True,
+            unique_fields=['student', 'course'],
+            update_fields=['final_mark', 'grade', 'computed_at'],
+        )
+        # Drop grades for courses where the recomputed students no longer have assessed marks
+        FinalGrade.objects.filter(student_id__in=student_ids).exclude(computed_at=now).delete()
+    return len(student_ids)
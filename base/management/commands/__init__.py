@@ -1,2 +0,0 @@
-# __init__.py
-from .generate_students_csv import Command as GenerateStudentsCSVCommand
@@ -0,0 +1,66 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from base.changes import marks_version, records_version
+from base.mark_views import DashboardView
+from base.models import School
+from base.sharding import get_school, school_database, use_school
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dashboard render time with a cold and a warm fragment cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Number of warm renders to time')
+        parser.add_argument('--school', help="Code of the school whose dashboard to render (default: the default database)")
+
+    def handle(self, *args, **options):
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            self.run(school, options['iterations'])
+
+    def run(self, school, iterations):
+        view = DashboardView.as_view()
+        factory = RequestFactory()
+        # An unsaved user passes login_required without touching the database
+        user = User(username='bench-dashboard', is_active=True)
+        connection = connections[school_database()]
+
+        def render():
+            request = factory.get('/dashboard/')
+            request.user = user
+            request.school = school
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                view(request).render()
+            return (time.perf_counter() - start) * 1000, len(queries)
+
+        # Drop only the dashboard's own fragments; the cache may be shared
+        cache.delete_many([
+            make_template_fragment_key('dashboard_stats', [marks_version(), records_version()]),
+            make_template_fragment_key('sidebar_navbar', [user.username, school.code if school else '']),
+        ])
+        cold_ms, cold_queries = render()
+        self.stdout.write(f'Cold render: {cold_ms:.2f} ms, {cold_queries} queries')
+
+        timings = []
+        queries = 0
+        for _ in range(iterations):
+            ms, queries = render()
+            timings.append(ms)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f"Warm render ({iterations} runs): mean {statistics.mean(timings):.2f} ms, "
+            f"median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, {queries} queries"
+        )
@@ -0,0 +1,58 @@
+import os
+import re
+import shutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Comments are dropped except /*! ... */ licence banners.
+CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+CSS_COLON_RE = re.compile(r':\s+')
+SOURCE_MAP_RE = re.compile(r'^\s*(?://|/\*)#\s*sourceMappingURL=.*$', re.M)
+
+
+def minify_css(css):
+    css = CSS_COMMENT_RE.sub('', css)
+    css = CSS_SPACE_RE.sub(' ', css)
+    css = CSS_PUNCTUATION_RE.sub(r'\1', css)
+    css = CSS_COLON_RE.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+
+class Command(BaseCommand):
+    help = 'Bundle and minify the vendored CSS/JS in assets/ into static/dist/'
+
+    def handle(self, *args, **options):
+        source_dir = settings.ASSETS_DIR
+        output_dir = settings.STATICFILES_DIRS[0]
+
+        for output, sources in settings.ASSET_BUNDLES.items():
+            parts = []
+            for source in sources:
+                path = os.path.join(source_dir, source)
+                if not os.path.exists(path):
+                    raise CommandError(f'Missing asset {path}')
+                with open(path, encoding='utf-8') as f:
+                    content = SOURCE_MAP_RE.sub('', f.read())
+                if output.endswith('.css') and '.min.' not in source:
+                    content = minify_css(content)
+                parts.append(content.strip())
+
+            separator = '\n' if output.endswith('.css') else ';\n'
+            self._write(output_dir, output, separator.join(parts) + '\n')
+
+        for output, source in settings.ASSET_FILES.items():
+            target = os.path.join(output_dir, output)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(source_dir, source), target)
+            self.stdout.write(f'Copied {output}')
+
+        self.stdout.write(self.style.SUCCESS('Assets built. Run collectstatic to fingerprint and compress them.'))
+
+    def _write(self, output_dir, name, content):
+        target = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.stdout.write(f'Wrote {name} ({len(content.encode()) // 1024} KiB)')
@@ -0,0 +1,56 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from base.models import School
+from base.query_plans import LARGE_TABLE_ROWS, SCENARIOS, capture, compare_reports, describe_finding
+from base.sharding import get_school, use_school
+
+
+class Command(BaseCommand):
+    help = ('Run the key dashboard, report and admin queries, capture their query plans '
+            '(EXPLAIN ANALYZE on PostgreSQL) and flag full scans of large tables and missing indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a summary')
+        parser.add_argument('--compare', help='Earlier JSON report to list regressions against')
+        parser.add_argument('--large-table-rows', type=int, default=LARGE_TABLE_ROWS,
+                            help='Row count from which a full table scan is flagged')
+        parser.add_argument('--school', help="Code of the school whose database to use (default: the default database)")
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            report = capture(options['scenarios'], large_table_rows=options['large_table_rows'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True, default=str)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True, default=str))
+        else:
+            for name, scenario in report['scenarios'].items():
+                self.stdout.write(f"{name}: {scenario['query_count']} queries, {scenario['duration_ms']:.1f} ms")
+                if scenario['error']:
+                    self.stdout.write(self.style.ERROR(f"  failed: {scenario['error']}"))
+                unexplained = [query for query in scenario['queries'] if query.get('error')]
+                if unexplained:
+                    self.stdout.write(self.style.ERROR(
+                        f"  {len(unexplained)} queries could not be explained: {unexplained[0]['error']}"))
+                for finding in scenario['findings']:
+                    self.stdout.write(self.style.WARNING(f'  {describe_finding(finding)}'))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                regressions = compare_reports(json.load(f), report)
+            for message in regressions:
+                self.stderr.write(self.style.WARNING(message))
+            if not regressions:
+                self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from base.uploads import compress_old_uploads
+
+
+class Command(BaseCommand):
+    help = 'Gzip-compress stored mark sheets older than the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30, help='Minimum age of uploads to compress, in days')
+
+    def handle(self, *args, **options):
+        count = compress_old_uploads(options['older_than'])
+        self.stdout.write(self.style.SUCCESS(f'Compressed {count} mark sheets.'))
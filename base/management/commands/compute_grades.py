@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from base.grading import compute_stream_grades
+from base.models import School, Stream
+from base.sharding import get_school, use_school
+
+
+class Command(BaseCommand):
+    help = 'Compute weighted final marks and grades for one or all streams'
+
+    def add_arguments(self, parser):
+        parser.add_argument('streams', nargs='*', help='Stream names (default: all current streams)')
+        parser.add_argument('--full', action='store_true', help='Recompute every student, not only those whose marks changed')
+        parser.add_argument('--school', help="Code of the school whose database to use (default: the default database)")
+
+    def handle(self, *args, **options):
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            self.run(**options)
+
+    def run(self, **options):
+        if options['streams']:
+            streams = list(Stream.objects.filter(name__in=options['streams']))
+            missing = set(options['streams']) - {stream.name for stream in streams}
+            if missing:
+                raise CommandError(f"Unknown stream(s): {', '.join(sorted(missing))}")
+        else:
+            streams = list(Stream.objects.current())
+
+        for stream in streams:
+            count = compute_stream_grades(stream, full=options['full'])
+            self.stdout.write(f'{stream}: recomputed {count} students')
+        self.stdout.write(self.style.SUCCESS('Final grades are up to date.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from base.models import School
+from base.sharding import get_school, use_school
+from base.transfer import FORMATS, dump
+
+
+class Command(BaseCommand):
+    help = ('Dump the base app tables (addresses, streams, courses, assessments, programs, students, teachers, '
+            'marks, final grades, uploads, audit log) as streamed, gzip-compressed files')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl',
+                            help='jsonl (portable, remaps ids on restore) or copy (PostgreSQL COPY, verbatim ids)')
+        parser.add_argument('--jobs', type=int, default=4, help='Number of tables dumped concurrently')
+        parser.add_argument('--school', help="Code of the school whose database to use (default: the default database)")
+
+    def handle(self, *args, **options):
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            self.run(**options)
+
+    def run(self, **options):
+        try:
+            manifest = dump(options['directory'], fmt=options['format'], jobs=options['jobs'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for table in manifest['tables']:
+            self.stdout.write(f"{table['table']}: {table['rows']} rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Dumped {sum(t['rows'] for t in manifest['tables'])} rows to {options['directory']}. "
+            f"Uploaded mark sheet files are not included; copy MEDIA_ROOT separately."
+        ))
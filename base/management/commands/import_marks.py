@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from base.marks_import import import_mark_files
+from base.models import School
+from base.sharding import get_school, use_school
+import os
+
+
+class Command(BaseCommand):
+    help = 'Import mark CSVs from a directory or zip archive using a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory or zip archive containing mark CSV files')
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Marks per bulk insert')
+        parser.add_argument('--user', help='Username recorded in the mark audit log')
+        parser.add_argument('--school', help="Code of the school whose database to use (default: the default database)")
+
+    def handle(self, *args, **options):
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            self.run(**options)
+
+    def run(self, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        report = import_mark_files(path, workers=options['workers'], batch_size=options['batch_size'], user=user)
+
+        for result in report['files']:
+            self.stdout.write(f"{result['file']}: {result['created']} marks, {len(result['errors'])} errors")
+            for line, error in result['errors'][:10]:
+                self.stdout.write(self.style.WARNING(f'  line {line}: {error}' if line else f'  {error}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} marks from {len(report['files'])} files "
+            f"using {report['workers']} workers ({report['errors']} errors)."
+        ))
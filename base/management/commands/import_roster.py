@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from base.models import Program, School, Stream
+from base.roster import import_roster_file
+from base.sharding import get_school, use_school
+
+
+class Command(BaseCommand):
+    help = 'Import a student roster (CSV or XLSX) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the roster file')
+        parser.add_argument('--program', help='Name of the program to enroll students without a Program column in')
+        parser.add_argument('--stream', help='Name of the stream to assign students without a Stream column to')
+        parser.add_argument('--enroll-courses', action='store_true',
+                            help="Also enroll new students in their program's courses")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+        parser.add_argument('--school', help="Code of the school whose database to use (default: the default database)")
+
+    def handle(self, *args, **options):
+        try:
+            school = get_school(options['school']) if options['school'] else None
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        with use_school(school):
+            self.run(**options)
+
+    def run(self, **options):
+        program = stream = None
+        try:
+            if options['program']:
+                program = Program.objects.get(name=options['program'])
+            if options['stream']:
+                stream = Stream.objects.get(name=options['stream'])
+        except (Program.DoesNotExist, Stream.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        try:
+            result = import_roster_file(
+                options['path'],
+                program=program,
+                stream=stream,
+                enroll_in_courses=options['enroll_courses'],
+                batch_size=options['batch_size'],
+            )
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(f'Could not import roster: {e}')
+
+        if result['invalid']:
+            self.stdout.write(self.style.WARNING(
+                f"Ignored {len(result['invalid'])} rows without a student or national ID "
+                f"(lines {', '.join(map(str, result['invalid'][:20]))})."
+            ))
+        if result['duplicates']:
+            self.stdout.write(self.style.WARNING(
+                f"Rejected {len(result['duplicates'])} rows whose student ID belongs to another student "
+                f"(lines {', '.join(map(str, result['duplicates'][:20]))})."
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(result['created'])} students, skipped {result['skipped']} existing national IDs."
+        ))
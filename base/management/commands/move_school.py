@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from base.models import School
+from base.schools import move_school
+
+
+class Command(BaseCommand):
+    help = ("Move a school's data to another database and point the school at it. "
+            "Run it while the school is quiet: changes made during the copy are not carried over.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('school', help='Code of the school to move')
+        parser.add_argument('database', help='Alias of the database to move the school to (see DB_SHARDS)')
+        parser.add_argument('--jobs', type=int, default=4, help='Number of tables copied concurrently')
+        parser.add_argument('--delete-source', action='store_true',
+                            help="Remove the school's rows from the old database once the copy is verified")
+
+    def handle(self, *args, **options):
+        try:
+            school = School.objects.get(code=options['school'])
+        except School.DoesNotExist:
+            raise CommandError(f"Unknown school {options['school']}")
+
+        source = school.database
+        try:
+            copied = move_school(school, options['database'], jobs=options['jobs'],
+                                 delete_source=options['delete_source'], stdout=self.stdout)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {school.code} from {source} to {school.database} ({copied} rows)."
+            + ('' if options['delete_source'] else f' The old rows remain in {source}.')
+        ))
@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Each target is started in a fresh interpreter with `-X importtime`.
+TARGETS = {
+    'wsgi': ['-c', 'import Markcraft.wsgi'],
+    'asgi': ['-c', 'import Markcraft.asgi'],
+    'manage': ['manage.py', 'help', '--commands'],
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parses `python -X importtime` output.
+    Returns a list of (module, self_us, cumulative_us) tuples for every import
+    and the total cumulative time of the top-level imports in microseconds.
+    """
+    modules = []
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = len(name) - len(name.lstrip())
+        module = name.strip()
+        modules.append((module, int(self_us), int(cumulative_us)))
+        if depth == 1:
+            total += int(cumulative_us)
+    return modules, total
+
+
+class Command(BaseCommand):
+    help = 'Report the import-time cost of starting manage.py and the WSGI/ASGI workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*', help=f"Targets to profile: {', '.join(TARGETS)} (default: all)")
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest modules to list')
+        parser.add_argument('--json', action='store_true', help='Output a machine-readable report')
+
+    def handle(self, *args, **options):
+        unknown = set(options['targets']) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown target(s): {', '.join(sorted(unknown))}")
+
+        report = {}
+        for target in options['targets'] or list(TARGETS):
+            report[target] = self.profile(target, options['top'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for target, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{target}: {result['wall_ms']:.0f} ms wall, {result['import_ms']:.0f} ms importing "
+                f"{result['modules']} modules"
+            ))
+            for module, self_ms, cumulative_ms in result['slowest']:
+                self.stdout.write(f'  {cumulative_ms:8.1f} ms  {self_ms:8.1f} ms self  {module}')
+
+    def profile(self, target, top):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Markcraft.settings'))
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime'] + TARGETS[target],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+        if proc.returncode != 0:
+            errors = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+            raise CommandError(f'{target} failed to start:\n' + '\n'.join(errors[-20:]))
+
+        modules, total = parse_importtime(proc.stderr)
+        slowest = sorted(modules, key=lambda m: m[2], reverse=True)[:top]
+        return {
+            'wall_ms': round(wall_ms, 1),
+            'import_ms': round(total / 1000, 1),
+            'modules': len(modules),
+            'slowest': [(name, round(self_us / 1000, 1), round(cum_us / 1000, 1)) for name, self_us, cum_us in slowest],
+        }
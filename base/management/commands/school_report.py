@@ -0,0 +1,33 @@
+import json
+from django.core.management.base import BaseCommand
+from base.schools import group_report
+
+
+class Command(BaseCommand):
+    help = 'Report students and marks across every school database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of school databases queried concurrently')
+        parser.add_argument('--json', action='store_true', help='Output a machine-readable report')
+
+    def handle(self, *args, **options):
+        report = group_report(workers=options['workers'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=float))
+            return
+
+        for code, summary in report['schools'].items():
+            self.stdout.write(
+                f"{code or 'default'}: {summary['students']} students, {summary['courses']} courses, "
+                f"{summary['marks']} marks, average {_format(summary['average_mark'])}"
+            )
+        total = report['total']
+        self.stdout.write(self.style.SUCCESS(
+            f"All schools: {total['students']} students, {total['marks']} marks, "
+            f"average {_format(total['average_mark'])}, highest {_format(total['highest_mark'])}, "
+            f"lowest {_format(total['lowest_mark'])}"
+        ))
+
+
+def _format(value):
+    return '-' if value is None else f'{value:.2f}'
@@ -1,27 +1,251 @@
+import asyncio
+import json
+import os
+import tempfile
+import zipfile
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.db.models import Count, Avg, Q , Min, Max 
+from django.middleware.csrf import CsrfViewMiddleware, get_token
+from django.utils.decorators import method_decorator
+from django.utils.text import slugify
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_http_methods, require_POST
 from django.views.generic import TemplateView 
 
-from .models import  Mark, Student
+from .changes import marks_etag, marks_last_modified, marks_version, records_version
+from .events import broker, mark_statistics, school_channel
+from .gradebook import Gradebook
+from .marks_import import import_mark_files
+from .models import  Mark, Stream, Student
+from .sharding import use_school
+from .sync import sync_marks as apply_sync
+
+class DashboardStats:
+    """
+    Lazily computed dashboard statistics.
+    Nothing is queried until a value is read, so cached template fragments
+    that never read them cost no queries. All mark statistics come from one aggregate.
+    """
+
+    def __init__(self):
+        self._marks = None
+
+    def marks(self):
+        if self._marks is None:
+            self._marks = Mark.objects.aggregate(
+                count=Count('id'), average=Avg('mark'), highest=Max('mark'), lowest=Min('mark'),
+            )
+        return self._marks
+
+    def total_students(self):
+        return Student.objects.count()
+
+    def total_marks(self):
+        return self.marks()['count']
+
+    def average_mark(self):
+        return self.marks()['average']  # None when there are no marks
+
+    def highest_mark(self):
+        return self.marks()['highest']
+
+    def lowest_mark(self):
+        return self.marks()['lowest']
 
+
+@method_decorator(login_required, name='dispatch')
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=marks_etag, last_modified_func=marks_last_modified), name='dispatch')
 class DashboardView(TemplateView):
     template_name = 'home_content.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Total counts
-        context['total_students'] = Student.objects.count()
-        context['total_marks'] = Mark.objects.count()
+        # Keys for the cached statistics fragment; they change whenever a mark,
+        # student or course does
+        context['marks_version'] = marks_version()
+        context['records_version'] = records_version()
 
-        # Overall statistics (using aggregation)
-        average_mark = Mark.objects.aggregate(Avg('mark'))
-        context['average_mark'] = average_mark.get('mark__avg', 0.0)  # Handle potential absence of marks
+        # Passed as callables so the template only evaluates them on a cache miss
+        stats = DashboardStats()
+        context['total_students'] = stats.total_students
+        context['total_marks'] = stats.total_marks
+        context['average_mark'] = stats.average_mark
+        context['highest_mark'] = stats.highest_mark
+        context['lowest_mark'] = stats.lowest_mark
+        return context
 
-        highest_mark = Mark.objects.aggregate(Max('mark'))
-        context['highest_mark'] = highest_mark.get('mark__max', 0)  # Handle potential absence of marks
 
-        lowest_mark = Mark.objects.aggregate(Min('mark'))
-        context['lowest_mark'] = lowest_mark.get('mark__min', 0)  # Handle potential absence of marks
-        return context
+HEARTBEAT_SECONDS = 15
+
+
+def _sse(event):
+    lines = [f"event: {event['type']}"]
+    if event.get('version') is not None:
+        lines.append(f"id: {event['version']}")
+    lines.append(f'data: {json.dumps(event, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+SNAPSHOT_ATTEMPTS = 3
+
+
+@login_required
+async def dashboard_events(request):
+    """
+    Server-sent events stream of dashboard statistics (requires an ASGI server).
+    Sends a snapshot on connect, then a delta or snapshot after every committed
+    mark change, with a comment line as heartbeat to keep proxies from closing it.
+    Every event carries the marks version it reflects; clients drop events whose
+    version is not newer than the state they hold.
+    """
+    # The stream is consumed after the middleware has returned, so the school
+    # is carried along explicitly.
+    school = getattr(request, 'school', None)
+
+    def snapshot():
+        # The subscription is opened first, so a change committed meanwhile
+        # also arrives as an event; the version tells the client whether the
+        # snapshot already counts it. It is read on both sides of the
+        # statistics and the snapshot retaken if a change landed in between.
+        with use_school(school):
+            version = marks_version()
+            for _ in range(SNAPSHOT_ATTEMPTS):
+                event = mark_statistics()
+                latest, version = version, marks_version()
+                if latest == version:
+                    break
+            event['version'] = version
+            return event
+
+    async def stream():
+        queue = broker.subscribe(school_channel(school))
+        try:
+            yield _sse(await sync_to_async(snapshot)())
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                if event['type'] == 'resync':
+                    event = await sync_to_async(snapshot)()
+                yield _sse(event)
+        finally:
+            broker.unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+
+@login_required
+def stream_gradebook(request, pk):
+    """
+    A stream's student x course gradebook: JSON for the dashboard, or a CSV
+    download with ``?format=csv``. ``?kind=E`` (or T, C) limits it to one assessment kind.
+    """
+    stream = get_object_or_404(Stream, pk=pk)
+    gradebook = Gradebook.for_stream(stream, kind=request.GET.get('kind'))
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{slugify(stream.name)}-gradebook.csv"'
+        gradebook.write_csv(response)
+        return response
+    return JsonResponse({'stream': stream.name, **gradebook.to_dict()})
+
+
+def _reject_csrf(request):
+    # Runs the CSRF check the middleware skipped, reporting only whether it failed
+    return CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {}) is not None
+
+
+@csrf_exempt  # checked in the view, so failures are answered in JSON
+@require_http_methods(['GET', 'POST'])
+@gzip_page
+def sync_marks(request):
+    """
+    Delta sync for offline mark entry.
+    Devices sign in through the accounts login (session cookie), then GET this
+    URL for a CSRF token and send it in the X-CSRFToken header of every POST.
+    The POST body is {"stream": pk, "token": str or null, "courses": [codes], "changes": [...]};
+    see base.sync.sync_marks for the change format and the response.
+    Errors are JSON: 400 for malformed requests, 401 when not signed in, 403 for a bad CSRF token.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if request.method == 'GET':
+        return JsonResponse({'csrf_token': get_token(request)})
+    if _reject_csrf(request):
+        return JsonResponse({'error': 'CSRF token missing or incorrect'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValueError('expected an object')
+        changes = payload.get('changes') or []
+        courses = payload.get('courses') or None
+        if not isinstance(changes, list):
+            raise ValueError('"changes" must be a list')
+        if not isinstance(payload.get('stream'), int) or isinstance(payload['stream'], bool):
+            raise ValueError('"stream" must be a stream id')
+        if not isinstance(payload.get('token') or '', str):
+            raise ValueError('"token" must be a string')
+        if courses is not None and not (isinstance(courses, list) and all(isinstance(c, str) for c in courses)):
+            raise ValueError('"courses" must be a list of course codes')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid sync request: {e}'}, status=400)
+    stream = Stream.objects.filter(pk=payload['stream']).first()
+    if stream is None:
+        return JsonResponse({'error': 'Unknown stream'}, status=404)
+    return JsonResponse(apply_sync(
+        stream, token=payload.get('token'), changes=changes, courses=courses, user=request.user,
+    ))
+
+
+# Worker processes an import request may fork
+MAX_IMPORT_WORKERS = 4
+
+
+@csrf_exempt  # checked in the view, so failures are answered in JSON
+@require_POST
+def import_marks(request):
+    """
+    Imports the mark sheets of a zip archive (or a single CSV) posted as ``file``,
+    in one process unless ``workers`` asks for more (up to MAX_IMPORT_WORKERS).
+    Authenticated like sync_marks. Returns the consolidated import report.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if _reject_csrf(request):
+        return JsonResponse({'error': 'CSRF token missing or incorrect'}, status=403)
+
+    file = request.FILES.get('file')
+    extension = os.path.splitext(file.name)[1].lower() if file else ''
+    if extension not in ('.zip', '.csv'):
+        return JsonResponse({'error': 'Upload a zip archive or a CSV file as "file"'}, status=400)
+    workers = request.POST.get('workers') or None
+    if workers is not None and not (workers.isdigit() and int(workers) > 0):
+        return JsonResponse({'error': '"workers" must be a positive number'}, status=400)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'sheets{extension}')
+        with open(path, 'wb') as destination:
+            for chunk in file.chunks():
+                destination.write(chunk)
+        if extension == '.zip' and not zipfile.is_zipfile(path):
+            return JsonResponse({'error': 'The file is not a zip archive'}, status=400)
+        report = import_mark_files(path, workers=min(int(workers or 1), MAX_IMPORT_WORKERS), user=request.user)
+
+    # Name the sheets as uploaded rather than by their temporary path
+    for result in report['files']:
+        result['file'] = file.name if result['file'] == path else result['file'].removeprefix(f'{path}:')
+    return JsonResponse(report)
@@ -0,0 +1,232 @@
+import csv
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+
+from .changes import marks_changed
+from .events import marks_delta
+from .models import Assessment, Course, Mark, MarkAudit, Student
+from .sharding import current_school, use_school
+
+BATCH_SIZE = 1000
+
+
+def parse_mark_rows(lines):
+    """
+    Parses mark sheet lines in the ``student_id, course_code, mark[, assessment]`` format.
+    A leading header row (one whose mark column is not a number) is skipped.
+    Parameters:
+        - lines (iterable of str): Lines of the CSV file.
+    Returns an iterator of (line_number, student_id, course_code, mark, assessment) tuples,
+    where mark is None when the value could not be parsed and assessment is '' when absent.
+    """
+    for line, row in enumerate(csv.reader(lines), start=1):
+        if not any(row):
+            continue
+        if len(row) not in (3, 4):
+            yield line, None, None, None, ''
+            continue
+        student_id, course_code, mark_value, *assessment = (value.strip() for value in row)
+        try:
+            mark = Decimal(mark_value)
+        except InvalidOperation:
+            if line == 1:
+                continue
+            mark = None
+        yield line, student_id, course_code, mark, assessment[0] if assessment else ''
+
+
+def import_mark_rows(rows, batch_size=BATCH_SIZE, source='', user=None, upload=None):
+    """
+    Creates marks from parsed rows with bulk inserts, all in one transaction,
+    so a sheet that fails part way leaves no marks behind.
+    Students and courses are resolved from two lookup queries per batch
+    instead of two queries per row, and each batch is audited with one
+    additional bulk insert into MarkAudit.
+    Parameters:
+        - rows (iterable): Tuples produced by ``parse_mark_rows``.
+        - batch_size (int): Number of marks per bulk insert.
+        - source (str): Name of the sheet, used in the report.
+        - user (User): User recorded as the author of the marks.
+        - upload (MarkUpload): Stored sheet the rows were read from.
+    Returns a report dict with the created count and a list of row errors.
+    """
+    report = {'file': source, 'created': 0, 'errors': []}
+    batch = []
+    with transaction.atomic(using=router.db_for_write(Mark)):
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _import_batch(batch, report, user, upload)
+                batch = []
+        if batch:
+            _import_batch(batch, report, user, upload)
+    return report
+
+
+def _import_batch(batch, report, user, upload):
+    student_ids = {row[1] for row in batch if row[1]}
+    course_codes = {row[2] for row in batch if row[2]}
+    students, ambiguous = {}, set()
+    for student_id, pk in Student.objects.filter(student_id__in=student_ids).values_list('student_id', 'pk'):
+        if student_id in students:
+            ambiguous.add(student_id)
+        students[student_id] = pk
+    courses = dict(Course.objects.filter(code__in=course_codes).values_list('code', 'pk'))
+    assessments = {}
+    if any(row[4] for row in batch):
+        assessments = {
+            (course_id, name): pk
+            for pk, course_id, name in Assessment.objects.filter(
+                course_id__in=courses.values()).values_list('pk', 'course_id', 'name')
+        }
+
+    marks = []
+    for line, student_id, course_code, mark, assessment in batch:
+        if student_id is None:
+            report['errors'].append((line, 'Expected student_id, course_code, mark[, assessment]'))
+        elif mark is None:
+            report['errors'].append((line, 'Invalid mark value'))
+        elif student_id not in students:
+            report['errors'].append((line, f'Unknown student {student_id}'))
+        elif student_id in ambiguous:
+            report['errors'].append((line, f'Student id {student_id} is shared by several students'))
+        elif course_code not in courses:
+            report['errors'].append((line, f'Unknown course {course_code}'))
+        elif assessment and (courses[course_code], assessment) not in assessments:
+            report['errors'].append((line, f'Unknown assessment {assessment} for course {course_code}'))
+        else:
+            marks.append(Mark(student_id=students[student_id], course_id=courses[course_code], mark=mark,
+                              assessment_id=assessments.get((courses[course_code], assessment)),
+                              upload_id=upload.pk if upload else None))
+
+    Mark.objects.bulk_create(marks)
+    MarkAudit.objects.bulk_create([MarkAudit.entry_for(mark, MarkAudit.CREATED, user=user) for mark in marks])
+    if marks:
+        marks_changed(marks_delta(marks))
+    report['created'] += len(marks)
+
+
+def import_mark_file(path, batch_size=BATCH_SIZE, user=None):
+    """
+    Imports a single mark CSV file from disk.
+    Parameters:
+        - path (str): Path to the CSV file.
+        - batch_size (int): Number of marks per bulk insert.
+        - user (User): User recorded as the author of the marks.
+    Returns the import report for the file.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as csv_file:
+        return import_mark_rows(parse_mark_rows(csv_file), batch_size, source=path, user=user)
+
+
+def import_upload(upload, batch_size=BATCH_SIZE, user=None, reimport=False):
+    """
+    Imports a stored mark sheet, streaming it from storage.
+    A sheet whose marks were already imported is skipped unless ``reimport`` is set;
+    the report then carries the number of marks imported before as ``already_imported``.
+    Parameters:
+        - upload (MarkUpload): Stored sheet to import.
+        - batch_size (int): Number of marks per bulk insert.
+        - user (User): User recorded as the author of the marks.
+        - reimport (bool): Import the sheet again even if its marks exist.
+    Returns the import report for the sheet.
+    """
+    if not reimport:
+        imported = upload.mark_set.count()
+        if imported:
+            return {'file': upload.original_name, 'created': 0, 'errors': [], 'already_imported': imported}
+    with upload.open_lines() as lines:
+        return import_mark_rows(parse_mark_rows(lines), batch_size, source=upload.original_name,
+                                user=user, upload=upload)
+
+
+def _import_zip_member(archive, member, batch_size, user):
+    with zipfile.ZipFile(archive) as zf, zf.open(member) as raw:
+        lines = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        return import_mark_rows(parse_mark_rows(lines), batch_size, source=f'{archive}:{member}', user=user)
+
+
+def collect_mark_sources(path):
+    """
+    Lists the mark sheets contained in a directory or zip archive.
+    Parameters:
+        - path (str): Directory, zip archive or single CSV file.
+    Returns a list of (archive, member) tuples; archive is None for plain files.
+    """
+    if os.path.isdir(path):
+        return [
+            (None, os.path.join(root, name))
+            for root, _, files in os.walk(path)
+            for name in sorted(files) if name.lower().endswith('.csv')
+        ]
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            return [(path, name) for name in zf.namelist() if name.lower().endswith('.csv')]
+    return [(None, path)]
+
+
+def _init_worker():
+    # Each worker process opens its own database connections rather than
+    # sharing the sockets inherited from the parent.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _import_source(source, batch_size, user=None, school=None):
+    archive, member = source
+    try:
+        with use_school(school):
+            if archive:
+                return _import_zip_member(archive, member, batch_size, user)
+            return import_mark_file(member, batch_size, user)
+    except Exception as e:
+        # The sheet's transaction was rolled back, so none of its marks were kept
+        name = f'{archive}:{member}' if archive else member
+        return {'file': name, 'created': 0, 'errors': [(None, str(e))]}
+
+
+def import_mark_files(path, workers=None, batch_size=BATCH_SIZE, user=None):
+    """
+    Imports every mark sheet in a directory or zip archive across a process pool.
+    Workers write to the database of the active school.
+    Parameters:
+        - path (str): Directory, zip archive or single CSV file.
+        - workers (int): Number of worker processes (default is the CPU count).
+        - batch_size (int): Number of marks per bulk insert.
+        - user (User): User recorded as the author of the marks.
+    Returns a consolidated report with per-file results and totals.
+    """
+    sources = collect_mark_sources(path)
+    workers = min(workers or os.cpu_count() or 1, len(sources)) or 1
+    if connections[router.db_for_write(Mark)].vendor == 'sqlite':
+        # SQLite allows one writer at a time.
+        workers = 1
+    school = current_school()
+
+    if workers == 1:
+        files = [_import_source(source, batch_size, user, school) for source in sources]
+    else:
+        # Don't let forked workers inherit open connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            files = list(pool.map(_import_source, sources, [batch_size] * len(sources),
+                                  [user] * len(sources), [school] * len(sources)))
+        # Workers bump the version and publish in their own processes, which
+        # neither a process-local cache nor this process's dashboards see.
+        if any(f['created'] for f in files):
+            marks_changed()
+
+    return {
+        'files': files,
+        'created': sum(f['created'] for f in files),
+        'errors': sum(len(f['errors']) for f in files),
+        'workers': workers,
+    }
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_mark_file_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='courses',
+            field=models.ManyToManyField(blank=True, help_text='Courses the student is enrolled in.', to='base.course'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_student_courses'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('C', 'Created'), ('U', 'Updated'), ('D', 'Deleted')], help_text='Kind of change.', max_length=1)),
+                ('old_value', models.DecimalField(blank=True, decimal_places=2, help_text='Mark before the change.', max_digits=5, null=True)),
+                ('new_value', models.DecimalField(blank=True, decimal_places=2, help_text='Mark after the change.', max_digits=5, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Date and time of the change.')),
+                ('changed_by', models.ForeignKey(blank=True, help_text='User who made the change.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('course', models.ForeignKey(help_text='Course the mark belongs to.', on_delete=django.db.models.deletion.CASCADE, to='base.course')),
+                ('mark', models.ForeignKey(blank=True, help_text='Mark that was changed (empty once the mark is deleted).', null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.mark')),
+                ('student', models.ForeignKey(help_text='Student the mark belongs to.', on_delete=django.db.models.deletion.CASCADE, to='base.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'changed_at'], name='base_markau_student_84c2b8_idx'), models.Index(fields=['course', 'changed_at'], name='base_markau_course__cf3dfe_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:05
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import migrations, models, transaction
+
+
+def move_file_uploads(apps, schema_editor):
+    """
+    Collapses the per-mark copies of each sheet into one content-addressed MarkUpload.
+    The per-mark files are deleted once the migration commits, since no mark
+    refers to them any more.
+    """
+    Mark = apps.get_model('base', 'Mark')
+    MarkUpload = apps.get_model('base', 'MarkUpload')
+    db_alias = schema_editor.connection.alias
+
+    names = (Mark.objects.using(db_alias).exclude(file_upload__isnull=True).exclude(file_upload='')
+             .values_list('file_upload', flat=True).distinct())
+    for name in names:
+        if not default_storage.exists(name):
+            continue
+        digest = hashlib.sha256()
+        with default_storage.open(name, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+
+        upload = MarkUpload.objects.using(db_alias).filter(sha256=digest).first()
+        if upload is None:
+            target = f'uploads/sha256/{digest[:2]}/{digest[2:4]}/{digest}.csv'
+            if not default_storage.exists(target):
+                with default_storage.open(name, 'rb') as f:
+                    target = default_storage.save(target, f)
+            upload = MarkUpload.objects.using(db_alias).create(
+                sha256=digest,
+                file=target,
+                original_name=os.path.basename(name),
+                size=default_storage.size(name),
+            )
+        Mark.objects.using(db_alias).filter(file_upload=name).update(upload=upload)
+        transaction.on_commit(lambda name=name: default_storage.delete(name), using=db_alias)
+
+
+def restore_file_uploads(apps, schema_editor):
+    """
+    Points marks back at a plain copy of their sheet. The per-mark file names
+    are not recorded by MarkUpload, so marks get the shared content-addressed
+    copy instead, decompressed again where the sheet was compressed.
+    """
+    Mark = apps.get_model('base', 'Mark')
+    MarkUpload = apps.get_model('base', 'MarkUpload')
+    db_alias = schema_editor.connection.alias
+
+    for upload in MarkUpload.objects.using(db_alias).iterator():
+        name = upload.file.name
+        if upload.compressed:
+            digest = upload.sha256
+            name = f'uploads/sha256/{digest[:2]}/{digest[2:4]}/{digest}.csv'
+            if not default_storage.exists(name):
+                with tempfile.TemporaryFile() as tmp:
+                    with default_storage.open(upload.file.name, 'rb') as raw, gzip.GzipFile(fileobj=raw) as gz:
+                        shutil.copyfileobj(gz, tmp)
+                    tmp.seek(0)
+                    name = default_storage.save(name, File(tmp))
+        Mark.objects.using(db_alias).filter(upload=upload).update(file_upload=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_markaudit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(help_text='SHA-256 digest of the uploaded file.', max_length=64, unique=True)),
+                ('file', models.FileField(help_text='Stored mark sheet (gzip-compressed when compressed is set).', max_length=255, upload_to='')),
+                ('original_name', models.CharField(help_text='File name as uploaded.', max_length=255)),
+                ('size', models.PositiveBigIntegerField(help_text='Size of the uncompressed file in bytes.')),
+                ('compressed', models.BooleanField(default=False, help_text='Whether the stored file is gzip-compressed.')),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True, help_text='Date and time of the first upload.')),
+                ('uploaded_by', models.ForeignKey(blank=True, help_text='User who first uploaded the file.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mark',
+            name='upload',
+            field=models.ForeignKey(blank=True, help_text='Mark sheet the mark was imported from.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.markupload'),
+        ),
+        migrations.RunPython(move_file_uploads, restore_file_uploads),
+        migrations.RemoveField(
+            model_name='mark',
+            name='file_upload',
+        ),
+    ]
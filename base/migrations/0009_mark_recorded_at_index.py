@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_mark_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mark',
+            name='recorded_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='Date and time when the mark was recorded.'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_mark_recorded_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the assessment, unique within the course.', max_length=120)),
+                ('kind', models.CharField(choices=[('T', 'Test'), ('C', 'Coursework'), ('E', 'Exam')], help_text='Type of assessment.', max_length=1)),
+                ('weight', models.DecimalField(decimal_places=2, help_text="Weight of the assessment in the final mark (relative to the course's other assessments).", max_digits=5)),
+                ('max_mark', models.DecimalField(decimal_places=2, default=100, help_text='Mark representing full marks for the assessment.', max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Date and time when the assessment was last updated.')),
+                ('course', models.ForeignKey(help_text='Course the assessment belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='assessments', to='base.course')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mark',
+            name='assessment',
+            field=models.ForeignKey(blank=True, help_text='Assessment the mark was obtained in.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.assessment'),
+        ),
+        migrations.CreateModel(
+            name='FinalGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('final_mark', models.DecimalField(decimal_places=2, help_text='Weighted final mark out of 100.', max_digits=5)),
+                ('grade', models.CharField(help_text='Grade band of the final mark.', max_length=2)),
+                ('computed_at', models.DateTimeField(help_text='Date and time when the grade was computed.')),
+                ('course', models.ForeignKey(help_text='Course the grade belongs to.', on_delete=django.db.models.deletion.CASCADE, to='base.course')),
+                ('student', models.ForeignKey(help_text='Student the grade belongs to.', on_delete=django.db.models.deletion.CASCADE, to='base.student')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='assessment',
+            constraint=models.UniqueConstraint(fields=('course', 'name'), name='unique_assessment_name_per_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='finalgrade',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_final_grade_per_course'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_assessments_final_grades'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='School',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(help_text='Short code identifying the school.', max_length=20, unique=True)),
+                ('name', models.CharField(help_text='Name of the school.', max_length=120)),
+                ('database', models.CharField(help_text="Database alias holding the school's data (one school per database).", max_length=64, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='markaudit',
+            name='changed_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='User who made the change.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='markupload',
+            name='uploaded_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='User who first uploaded the file.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='school',
+            field=models.ForeignKey(blank=True, help_text='School the teacher works at.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.school'),
+        ),
+    ]
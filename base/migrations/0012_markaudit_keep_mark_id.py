@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_schools'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='markaudit',
+            name='mark',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Mark that was changed (the mark may since have been deleted).', null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='base.mark'),
+        ),
+    ]
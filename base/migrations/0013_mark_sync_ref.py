@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_markaudit_keep_mark_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mark',
+            name='sync_ref',
+            field=models.UUIDField(blank=True, editable=False, help_text='Client key of a mark created through sync, used to recognise retried requests.', null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-19 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_mark_sync_ref'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='markaudit',
+            name='course',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Course the mark belongs to (the course may since have been deleted).', null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='base.course'),
+        ),
+        migrations.AlterField(
+            model_name='markaudit',
+            name='student',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Student the mark belongs to (the student may since have been deleted).', null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='base.student'),
+        ),
+    ]
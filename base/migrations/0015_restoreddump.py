@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-19 20:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_markaudit_keep_student_course_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestoredDump',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dump_id', models.CharField(help_text='Id of the dump, from its manifest.', max_length=32, unique=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Date and time the restore started.')),
+                ('completed_at', models.DateTimeField(blank=True, help_text='Date and time the restore finished; empty if it failed part way.', null=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+import gzip
+import io
+
+from django.db import models, router
+from django.db.models import BooleanField, Count, ExpressionWrapper, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+CURRENT_STREAMS_CACHE_KEY = 'base:current-stream-ids:{date}'
+CURRENT_STREAMS_CACHE_TIMEOUT = 60 * 60 * 24
+
 class AddressZW(models.Model):
     """
     Represents a Zimbabwean address.
@@ -22,6 +31,79 @@ class AddressZW(models.Model):
         return f"{address_lines}\n{self.city}, {self.province} ({self.postal_code})"
 
 
+class StreamQuerySet(models.QuerySet):
+    """
+    Set-based helpers for streams, so list pages don't evaluate dates per row.
+    """
+
+    def with_is_active(self, today=None):
+        """
+        Annotates each stream with ``active``, computed in the database.
+        Parameters:
+            - today (date): Reference date (default is today).
+        Returns a queryset of annotated streams.
+        """
+        today = today or timezone.now().date()
+        return self.annotate(active=ExpressionWrapper(
+            Q(start_date__lte=today, end_date__gte=today),
+            output_field=BooleanField(),
+        ))
+
+    def with_student_counts(self):
+        """
+        Annotates each stream with ``student_count``.
+        Returns a queryset of annotated streams.
+        """
+        return self.annotate(student_count=Count('student', distinct=True))
+
+    def upcoming(self):
+        """
+        Retrieves streams that are scheduled to start in the future.
+        Returns a queryset of upcoming streams.
+        """
+        today = timezone.now().date()
+        return self.filter(start_date__gte=today).order_by('start_date')
+
+    def past(self):
+        """
+        Retrieves streams that have already ended.
+        Returns a queryset of past streams.
+        """
+        today = timezone.now().date()
+        return self.filter(end_date__lt=today).order_by('-end_date')
+
+    def current(self):
+        """
+        Retrieves streams that are currently active.
+        The matching ids are cached for the day, since the set only changes at midnight
+        or when a stream is edited.
+        Returns a queryset of current streams.
+        """
+        return self.filter(pk__in=Stream.current_stream_ids())
+
+
+class ProgramQuerySet(models.QuerySet):
+    """
+    Set-based helpers for programs.
+    """
+
+    def with_counts(self):
+        """
+        Annotates each program with ``student_count`` and ``course_count`` in a single query.
+        Each count is a correlated subquery, so students and courses are never joined
+        against each other.
+        Returns a queryset of annotated programs.
+        """
+        students = (Student.objects.filter(program=OuterRef('pk')).order_by()
+                    .values('program').annotate(total=Count('pk')).values('total'))
+        courses = (Program.courses.through.objects.filter(program=OuterRef('pk')).order_by()
+                   .values('program').annotate(total=Count('pk')).values('total'))
+        return self.annotate(
+            student_count=Coalesce(Subquery(students, output_field=IntegerField()), Value(0)),
+            course_count=Coalesce(Subquery(courses, output_field=IntegerField()), Value(0)),
+        )
+
+
 class Stream(models.Model):
     """
     Represents an academic stream or cohort.
@@ -30,17 +112,60 @@ class Stream(models.Model):
     start_date = models.DateField(help_text="Start date of the stream.")
     end_date = models.DateField(help_text="End date of the stream.")
 
+    objects = StreamQuerySet.as_manager()
+
     def __str__(self):
         """
         Returns a string representation of the stream.
         """
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the stream and drops today's cached set of current streams.
+        """
+        super().save(*args, **kwargs)
+        Stream.clear_current_streams_cache()
+
+    def delete(self, *args, **kwargs):
+        """
+        Deletes the stream and drops today's cached set of current streams.
+        """
+        result = super().delete(*args, **kwargs)
+        Stream.clear_current_streams_cache()
+        return result
+
+    @staticmethod
+    def current_stream_ids():
+        """
+        Retrieves the ids of the currently active streams, cached per day.
+        Returns a list of stream ids.
+        """
+        today = timezone.now().date()
+        key = CURRENT_STREAMS_CACHE_KEY.format(date=today.isoformat())
+        ids = cache.get(key)
+        if ids is None:
+            ids = list(Stream.objects.filter(start_date__lte=today, end_date__gte=today)
+                       .values_list('pk', flat=True))
+            cache.set(key, ids, CURRENT_STREAMS_CACHE_TIMEOUT)
+        return ids
+
+    @staticmethod
+    def clear_current_streams_cache():
+        """
+        Removes today's cached set of current stream ids.
+        """
+        today = timezone.now().date()
+        cache.delete(CURRENT_STREAMS_CACHE_KEY.format(date=today.isoformat()))
+
     def is_active(self):
         """
         Checks if the stream is currently active based on the start and end dates.
+        Uses the ``active`` annotation when the stream was loaded through ``with_is_active()``.
         Returns True if active, False otherwise.
         """
+        if hasattr(self, 'active'):
+            return self.active
         today = timezone.now().date()
         return self.start_date <= today <= self.end_date
 
@@ -56,25 +181,22 @@ class Stream(models.Model):
         Retrieves streams that are scheduled to start in the future.
         Returns a queryset of upcoming streams.
         """
-        today = timezone.now().date()
-        return Stream.objects.filter(start_date__gte=today).order_by('start_date')
+        return Stream.objects.upcoming()
 
     def past_streams(self):
         """
         Retrieves streams that have already ended.
         Returns a queryset of past streams.
         """
-        today = timezone.now().date()
-        return Stream.objects.filter(end_date__lt=today).order_by('-end_date')
+        return Stream.objects.past()
 
     def current_streams(self):
         """
         Retrieves streams that are currently active.
         Returns a queryset of current streams.
         """
-        today = timezone.now().date()
-        return Stream.objects.filter(start_date__lte=today, end_date__gte=today)
-        
+        return Stream.objects.current()
+
 
 class Course(models.Model):
     """
@@ -123,19 +245,29 @@ class Course(models.Model):
 
     def enroll_student(self, student):
         """
-        Enrolls a student in the course.
+        Enrolls one or more students in the course.
+        Lists are written with a single bulk insert on the enrollment table;
+        students who are already enrolled are left untouched.
         Parameters:
-            - student (Student): Student object to enroll in the course.
-        """
-        self.student_set.add(student)
+            - student (Student or iterable of Student): Student(s) to enroll in the course.
+        """
+        students = _as_student_list(student)
+        Through = Student.courses.through
+        Through.objects.bulk_create(
+            [Through(student_id=s.pk, course_id=self.pk) for s in students],
+            ignore_conflicts=True,
+        )
 
     def remove_student(self, student):
         """
-        Removes a student from the course.
+        Removes one or more students from the course with a single delete.
         Parameters:
-            - student (Student): Student object to remove from the course.
+            - student (Student or iterable of Student): Student(s) to remove from the course.
         """
-        self.student_set.remove(student)
+        students = _as_student_list(student)
+        Student.courses.through.objects.filter(
+            course_id=self.pk, student_id__in=[s.pk for s in students]
+        ).delete()
 
 class Program(models.Model):
     """
@@ -145,6 +277,8 @@ class Program(models.Model):
     description = models.TextField(blank=True, help_text="Description of the program.")
     courses = models.ManyToManyField('Course', help_text="Courses included in the program.")
 
+    objects = ProgramQuerySet.as_manager()
+
     def __str__(self):
         """
         Returns a string representation of the program.
@@ -154,8 +288,11 @@ class Program(models.Model):
     def total_courses(self):
         """
         Calculates the total number of courses included in the program.
+        Uses the ``course_count`` annotation when loaded through ``with_counts()``.
         Returns an integer representing the total number of courses.
         """
+        if hasattr(self, 'course_count'):
+            return self.course_count
         return self.courses.count()
 
     def enrolled_students(self):
@@ -165,6 +302,34 @@ class Program(models.Model):
         """
         return Student.objects.filter(program=self)
 
+    def total_students(self):
+        """
+        Calculates the number of students enrolled in the program.
+        Uses the ``student_count`` annotation when loaded through ``with_counts()``.
+        Returns an integer representing the number of enrolled students.
+        """
+        if hasattr(self, 'student_count'):
+            return self.student_count
+        return self.enrolled_students().count()
+
+    def enroll_students(self, students, enroll_in_courses=False):
+        """
+        Moves a list of students into the program with a single update.
+        Parameters:
+            - students (iterable of Student): Students to enroll in the program.
+            - enroll_in_courses (bool): Also enroll the students in every course of the program.
+        """
+        students = _as_student_list(students)
+        Student.objects.filter(pk__in=[s.pk for s in students]).update(program=self)
+        if enroll_in_courses:
+            Through = Student.courses.through
+            Through.objects.bulk_create(
+                [Through(student_id=s.pk, course_id=course_id)
+                 for course_id in self.courses.values_list('pk', flat=True)
+                 for s in students],
+                ignore_conflicts=True,
+            )
+
 class Student(models.Model):
     """
     Represents a student enrolled in an educational program.
@@ -187,6 +352,7 @@ class Student(models.Model):
     parent_phone_number = models.CharField(max_length=15, help_text="Phone number of the student's parent/guardian.")
     class_year = models.ForeignKey(Stream, on_delete=models.SET_NULL, null=True, blank=True,
                                    help_text="Class year/stream of the student.")
+    courses = models.ManyToManyField(Course, blank=True, help_text="Courses the student is enrolled in.")
 
     def __str__(self):
         """
@@ -201,6 +367,33 @@ class Student(models.Model):
         """
         return Mark.objects.filter(student=self)
 
+def _as_student_list(student):
+    """
+    Normalises a single student or an iterable of students into a list.
+    """
+    if isinstance(student, Student):
+        return [student]
+    return list(student)
+
+
+class School(models.Model):
+    """
+    Represents a school served by this deployment.
+    Each school's students, courses and marks live in their own database
+    (see base.sharding); schools and teachers are kept in the default database.
+    """
+    code = models.SlugField(max_length=20, unique=True, help_text="Short code identifying the school.")
+    name = models.CharField(max_length=120, help_text="Name of the school.")
+    database = models.CharField(max_length=64, unique=True,
+                                help_text="Database alias holding the school's data (one school per database).")
+
+    def __str__(self):
+        """
+        Returns a string representation of the school.
+        """
+        return self.name
+
+
 class Teacher(models.Model):
     """
     Represents a teacher in an educational institution.
@@ -217,6 +410,8 @@ class Teacher(models.Model):
     phone_number = models.CharField(max_length=20, help_text="Phone number of the teacher.")
     address = models.ForeignKey(AddressZW, null=True, blank=True, on_delete=models.CASCADE,
                                 help_text="Address of the teacher.")
+    school = models.ForeignKey(School, null=True, blank=True, on_delete=models.SET_NULL,
+                               help_text="School the teacher works at.")
     qualifications = models.TextField(help_text="Qualifications of the teacher.")
     years_of_experience = models.PositiveIntegerField(help_text="Years of experience of the teacher.")
 
@@ -226,6 +421,24 @@ class Teacher(models.Model):
         """
         return f"{self.user.first_name} {self.user.last_name}"
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the teacher, first moving its address into the teacher's database.
+        Teachers live in the default database (see base.sharding), while an
+        address created with a school active is written to that school's database.
+        """
+        using = kwargs.get('using') or router.db_for_write(Teacher, instance=self)
+        address = self.address if self._meta.get_field('address').is_cached(self) else None
+        if address is not None and address._state.db not in (None, using):
+            source, source_pk = address._state.db, address.pk
+            address.pk = None
+            address._state.adding = True
+            address.save(using=using)
+            self.address = address
+            # Drop the original unless students share it
+            AddressZW.objects.using(source).filter(pk=source_pk, student__isnull=True).delete()
+        super().save(*args, **kwargs)
+
     def assigned_courses(self):
         """
         Retrieves the courses assigned to the teacher.
@@ -262,18 +475,252 @@ class Teacher(models.Model):
             recent_marks.extend(student.marks().order_by('-recorded_at')[:num])
         return recent_marks
 
+class Assessment(models.Model):
+    """
+    Represents a weighted assessment (test, coursework or exam) of a course.
+    """
+    TEST = 'T'
+    COURSEWORK = 'C'
+    EXAM = 'E'
+    KIND_CHOICES = (
+        (TEST, 'Test'),
+        (COURSEWORK, 'Coursework'),
+        (EXAM, 'Exam'),
+    )
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assessments',
+                               help_text="Course the assessment belongs to.")
+    name = models.CharField(max_length=120, help_text="Name of the assessment, unique within the course.")
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES, help_text="Type of assessment.")
+    weight = models.DecimalField(max_digits=5, decimal_places=2,
+                                 help_text="Weight of the assessment in the final mark (relative to the course's other assessments).")
+    max_mark = models.DecimalField(max_digits=5, decimal_places=2, default=100,
+                                   help_text="Mark representing full marks for the assessment.")
+    updated_at = models.DateTimeField(auto_now=True, help_text="Date and time when the assessment was last updated.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'name'], name='unique_assessment_name_per_course'),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the assessment.
+        """
+        return f"{self.course.code} - {self.name} ({self.weight})"
+
+
+class MarkUpload(models.Model):
+    """
+    Represents an uploaded mark sheet, stored once and addressed by the SHA-256 of its content.
+    """
+    sha256 = models.CharField(max_length=64, unique=True, help_text="SHA-256 digest of the uploaded file.")
+    file = models.FileField(max_length=255, help_text="Stored mark sheet (gzip-compressed when compressed is set).")
+    original_name = models.CharField(max_length=255, help_text="File name as uploaded.")
+    size = models.PositiveBigIntegerField(help_text="Size of the uncompressed file in bytes.")
+    compressed = models.BooleanField(default=False, help_text="Whether the stored file is gzip-compressed.")
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False,
+                                    help_text="User who first uploaded the file.")
+    uploaded_at = models.DateTimeField(auto_now_add=True, help_text="Date and time of the first upload.")
+
+    def __str__(self):
+        """
+        Returns a string representation of the upload.
+        """
+        return f"{self.original_name} ({self.sha256[:12]})"
+
+    def open_lines(self):
+        """
+        Opens the stored sheet as a text stream, decompressing on the fly when needed.
+        The file is read from storage incrementally rather than loaded into memory.
+        Returns a text file object; callers should close it (it supports ``with``).
+        """
+        raw = self.file.storage.open(self.file.name, 'rb')
+        if self.compressed:
+            raw = gzip.GzipFile(fileobj=raw, mode='rb')
+        return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+
 class Mark(models.Model):
     """
     Represents a mark recorded for a student in a course by a teacher.
     """
     student = models.ForeignKey(Student, on_delete=models.CASCADE, help_text="Student associated with the mark.")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, help_text="Course associated with the mark.")
+    assessment = models.ForeignKey(Assessment, on_delete=models.SET_NULL, null=True, blank=True,
+                                   help_text="Assessment the mark was obtained in.")
     mark = models.DecimalField(max_digits=5, decimal_places=2, help_text="Mark recorded for the student.")
-    recorded_at = models.DateTimeField(auto_now_add=True, help_text="Date and time when the mark was recorded.")
-    file_upload = models.FileField(upload_to='uploads/%Y/%m/%d/', help_text="Upload file with student marks.", null=True)
+    recorded_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text="Date and time when the mark was recorded.")
+    upload = models.ForeignKey(MarkUpload, on_delete=models.SET_NULL, null=True, blank=True,
+                               help_text="Mark sheet the mark was imported from.")
+    sync_ref = models.UUIDField(null=True, blank=True, unique=True, editable=False,
+                                help_text="Client key of a mark created through sync, used to recognise retried requests.")
     
     def __str__(self):
         """
         Returns a string representation of the mark.
         """
         return f"{self.student} - {self.course}: {self.mark}"
+
+    def history(self):
+        """
+        Retrieves the audit history of this mark, newest first.
+        Returns a queryset of audit entries.
+        """
+        return self.markaudit_set.order_by('-changed_at', '-pk')
+
+
+class FinalGrade(models.Model):
+    """
+    Represents the computed weighted final mark and grade of a student in a course.
+    Maintained by base.grading; recomputed only for students whose marks changed.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, help_text="Student the grade belongs to.")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, help_text="Course the grade belongs to.")
+    final_mark = models.DecimalField(max_digits=5, decimal_places=2, help_text="Weighted final mark out of 100.")
+    grade = models.CharField(max_length=2, help_text="Grade band of the final mark.")
+    computed_at = models.DateTimeField(help_text="Date and time when the grade was computed.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_final_grade_per_course'),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the final grade.
+        """
+        return f"{self.student} - {self.course}: {self.final_mark} ({self.grade})"
+
+
+class MarkAuditQuerySet(models.QuerySet):
+    """
+    Query helpers for reading mark history.
+    """
+
+    def for_student(self, student):
+        """
+        Retrieves the audit history of one student's marks, newest first.
+        Parameters:
+            - student (Student or int): Student object or primary key.
+        Returns a queryset of audit entries.
+        """
+        return self.filter(student=student).order_by('-changed_at', '-pk')
+
+    def for_course(self, course):
+        """
+        Retrieves the audit history of one course's marks, newest first.
+        Parameters:
+            - course (Course or int): Course object or primary key.
+        Returns a queryset of audit entries.
+        """
+        return self.filter(course=course).order_by('-changed_at', '-pk')
+
+    def compact(self):
+        """
+        Returns the history as plain tuples instead of model instances:
+        (changed_at, action, student_id, course_id, mark_id, old_value, new_value, user_id).
+        Users live in the default database, so they are not joined here.
+        """
+        return self.values_list(
+            'changed_at', 'action', 'student_id', 'course_id', 'mark_id',
+            'old_value', 'new_value', 'changed_by_id',
+        )
+
+
+class MarkAudit(models.Model):
+    """
+    Append-only record of a change to a mark.
+    Entries are written in bulk alongside the marks they describe and are never updated.
+    """
+    CREATED = 'C'
+    UPDATED = 'U'
+    DELETED = 'D'
+    ACTION_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    # No constraints and no cascades: entries outlive their mark, student and
+    # course and keep their ids. Nullable so joins are outer joins that keep them.
+    mark = models.ForeignKey(Mark, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                             help_text="Mark that was changed (the mark may since have been deleted).")
+    student = models.ForeignKey(Student, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                                help_text="Student the mark belongs to (the student may since have been deleted).")
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                               help_text="Course the mark belongs to (the course may since have been deleted).")
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES, help_text="Kind of change.")
+    old_value = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True,
+                                    help_text="Mark before the change.")
+    new_value = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True,
+                                    help_text="Mark after the change.")
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False,
+                                   help_text="User who made the change.")
+    changed_at = models.DateTimeField(default=timezone.now, help_text="Date and time of the change.")
+
+    objects = MarkAuditQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'changed_at']),
+            models.Index(fields=['course', 'changed_at']),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the audit entry.
+        """
+        return f"{self.get_action_display()} {self.student_id}/{self.course_id}: {self.old_value} -> {self.new_value}"
+
+    def save(self, *args, **kwargs):
+        """
+        Saves a new audit entry. Existing entries cannot be modified.
+        """
+        if self.pk is not None:
+            raise ValueError("Mark audit entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """
+        Audit entries cannot be deleted.
+        """
+        raise ValueError("Mark audit entries are append-only.")
+
+    @classmethod
+    def entry_for(cls, mark, action, old_value=None, user=None):
+        """
+        Builds (without saving) an audit entry for a mark.
+        Parameters:
+            - mark (Mark): The mark that changed.
+            - action (str): One of CREATED, UPDATED or DELETED.
+            - old_value (Decimal): Value before the change, if any.
+            - user (User): User who made the change.
+        Returns an unsaved MarkAudit instance.
+        """
+        return cls(
+            mark=mark,
+            student_id=mark.student_id,
+            course_id=mark.course_id,
+            action=action,
+            old_value=old_value,
+            new_value=None if action == cls.DELETED else mark.mark,
+            changed_by_id=user.pk if user is not None and user.is_authenticated else None,
+        )
+
+
+class RestoredDump(models.Model):
+    """
+    Records a dump loaded into this database (see base.transfer.restore),
+    so the same dump can't be loaded twice.
+    """
+    dump_id = models.CharField(max_length=32, unique=True, help_text="Id of the dump, from its manifest.")
+    started_at = models.DateTimeField(default=timezone.now, help_text="Date and time the restore started.")
+    completed_at = models.DateTimeField(null=True, blank=True,
+                                        help_text="Date and time the restore finished; empty if it failed part way.")
+
+    def __str__(self):
+        """
+        Returns a string representation of the restored dump.
+        """
+        return self.dump_id
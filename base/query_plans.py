@@ -0,0 +1,301 @@
+"""
+Query-plan capture for the project's key queries.
+
+Each scenario runs a real code path (dashboard statistics, course averages,
+recent marks, gradebooks, admin changelists) while its SQL is recorded.
+Every SELECT is then explained against the current database:
+
+- PostgreSQL: ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)``.
+- SQLite: ``EXPLAIN QUERY PLAN``.
+
+Plans are scanned for full scans of large tables and for filter columns that
+no index starts with. The report is plain JSON, so reports from two releases
+can be diffed or compared with ``compare_reports``.
+"""
+import datetime
+import json
+import re
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .events import mark_statistics
+from .gradebook import Gradebook
+from .grading import changed_students
+from .mark_views import DashboardStats
+from .models import Course, FinalGrade, Mark, MarkAudit, Program, Stream, Student
+from .schools import course_totals
+from .sharding import school_database
+
+LARGE_TABLE_ROWS = 10000
+
+
+# Scenarios
+
+def _dashboard():
+    stats = DashboardStats()
+    stats.total_students()
+    stats.marks()
+    mark_statistics()
+
+
+def _course_averages():
+    course_totals()
+    list(Program.objects.with_counts())
+
+
+def _recent_marks():
+    course = Course.objects.order_by('pk').first()
+    if course is not None:
+        list(course.recent_marks())
+    list(Mark.objects.select_related('student', 'course').order_by('-recorded_at')[:20])
+
+
+def _stream_gradebook():
+    stream = Stream.objects.current().first() or Stream.objects.order_by('pk').first()
+    if stream is not None:
+        Gradebook.for_stream(stream)
+        list(changed_students(stream))
+
+
+def _mark_history():
+    student = Student.objects.order_by('pk').first()
+    if student is not None:
+        list(MarkAudit.objects.for_student(student).compact()[:50])
+        list(student.marks())
+
+
+def _changelist(model):
+    def run():
+        request = RequestFactory().get(f'/admin/{model._meta.app_label}/{model._meta.model_name}/')
+        request.user = User(username='query-plans', is_active=True, is_staff=True, is_superuser=True)
+        admin.site._registry[model].changelist_view(request).render()
+    return run
+
+
+SCENARIOS = {
+    'dashboard': _dashboard,
+    'course_averages': _course_averages,
+    'recent_marks': _recent_marks,
+    'stream_gradebook': _stream_gradebook,
+    'mark_history': _mark_history,
+    'admin_marks': _changelist(Mark),
+    'admin_students': _changelist(Student),
+    'admin_final_grades': _changelist(FinalGrade),
+    'admin_mark_audit': _changelist(MarkAudit),
+    'admin_streams': _changelist(Stream),
+    'admin_programs': _changelist(Program),
+}
+
+
+# Capture
+
+def capture(names=None, using=None, large_table_rows=LARGE_TABLE_ROWS):
+    """
+    Runs scenarios and explains every SELECT they issue.
+    Queries run inside a transaction that is rolled back.
+    Parameters:
+        - names (list of str): Scenarios to run (default: all).
+        - using (str): Database alias (default: the active school's database).
+        - large_table_rows (int): Row count from which a full scan is flagged.
+    Returns the report dict.
+    """
+    using = using or school_database()
+    connection = connections[using]
+    explainer = _Explainer(connection, large_table_rows)
+    scenarios = {}
+    for name in names or SCENARIOS:
+        with transaction.atomic(using=using):
+            scenarios[name] = _run(SCENARIOS[name], connection, explainer)
+            transaction.set_rollback(True, using=using)
+
+    return {
+        'vendor': connection.vendor,
+        'database': using,
+        'captured_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'large_table_rows': large_table_rows,
+        'scenarios': scenarios,
+        'findings': sum(len(s['findings']) for s in scenarios.values()),
+    }
+
+
+def _run(fn, connection, explainer):
+    error = None
+    with CaptureQueriesContext(connection) as captured:
+        try:
+            with transaction.atomic(using=connection.alias):
+                fn()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+
+    queries = []
+    for query in captured.captured_queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        entry = {'sql': sql, 'duration_ms': round(float(query['time']) * 1000, 3)}
+        try:
+            # A savepoint, so a failed EXPLAIN doesn't abort the transaction on PostgreSQL
+            with transaction.atomic(using=connection.alias):
+                entry.update(explainer.explain(sql))
+        except DatabaseError as e:
+            entry.update({'plan': None, 'findings': [], 'error': f'{type(e).__name__}: {e}'})
+        queries.append(entry)
+    return {
+        'error': error,
+        'query_count': len(queries),
+        'duration_ms': round(sum(q['duration_ms'] for q in queries), 3),
+        'queries': queries,
+        'findings': [finding for q in queries for finding in q['findings']],
+    }
+
+
+class _Explainer:
+    def __init__(self, connection, large_table_rows):
+        self.connection = connection
+        self.large_table_rows = large_table_rows
+        self._table_names = None
+        self._rows = {}
+        self._indexed = {}
+        self._columns = {}
+
+    def explain(self, sql):
+        if self.connection.vendor == 'postgresql':
+            return self._explain_postgresql(sql)
+        if self.connection.vendor == 'sqlite':
+            return self._explain_sqlite(sql)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            return {'plan': [list(row) for row in cursor.fetchall()], 'findings': []}
+
+    def _explain_postgresql(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+            result = cursor.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        plan = result[0]
+        findings = []
+        for node in _plan_nodes(plan['Plan']):
+            if node['Node Type'] == 'Seq Scan':
+                findings.extend(self._scan_findings(node['Relation Name'], node.get('Filter', '')))
+        top = plan['Plan']
+        return {
+            'plan': plan,
+            'planning_ms': plan.get('Planning Time'),
+            'execution_ms': plan.get('Execution Time'),
+            'shared_hit_blocks': top.get('Shared Hit Blocks'),
+            'shared_read_blocks': top.get('Shared Read Blocks'),
+            'findings': findings,
+        }
+
+    def _explain_sqlite(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        findings = []
+        for detail in plan:
+            match = re.match(r'SCAN (\w+)(?: AS \w+)?$', detail)
+            if match and match.group(1) in self._tables():
+                table = match.group(1)
+                # The plan carries no filter; use the columns of this table the statement compares.
+                conditions = ' '.join(re.findall(rf'"{table}"\."\w+"\s*(?:=|<|>|IN|IS|LIKE)', sql))
+                findings.extend(self._scan_findings(table, conditions))
+        return {'plan': plan, 'findings': findings}
+
+    def _scan_findings(self, table, conditions):
+        rows = self._row_count(table)
+        if rows < self.large_table_rows:
+            return []
+        findings = [{'type': 'seq_scan', 'table': table, 'rows': rows}]
+        columns = [
+            column for column in self._table_columns(table)
+            if re.search(rf'\b{column}\b', conditions) and column not in self._indexed_columns(table)
+        ]
+        if columns:
+            findings.append({'type': 'missing_index', 'table': table, 'columns': columns})
+        return findings
+
+    def _tables(self):
+        if self._table_names is None:
+            with self.connection.cursor() as cursor:
+                self._table_names = set(self.connection.introspection.table_names(cursor))
+        return self._table_names
+
+    def _row_count(self, table):
+        if table not in self._rows:
+            with self.connection.cursor() as cursor:
+                rows = -1
+                if self.connection.vendor == 'postgresql':
+                    cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+                    row = cursor.fetchone()
+                    rows = row[0] if row else -1
+                if rows < 0:  # never analyzed, or no estimate available
+                    cursor.execute(f'SELECT COUNT(*) FROM {self.connection.ops.quote_name(table)}')
+                    rows = cursor.fetchone()[0]
+            self._rows[table] = rows
+        return self._rows[table]
+
+    def _table_columns(self, table):
+        if table not in self._columns:
+            with self.connection.cursor() as cursor:
+                self._columns[table] = [
+                    column.name for column in self.connection.introspection.get_table_description(cursor, table)
+                ]
+        return self._columns[table]
+
+    def _indexed_columns(self, table):
+        """
+        Columns that lead an index, primary key or unique constraint.
+        """
+        if table not in self._indexed:
+            with self.connection.cursor() as cursor:
+                constraints = self.connection.introspection.get_constraints(cursor, table)
+            self._indexed[table] = {
+                constraint['columns'][0] for constraint in constraints.values()
+                if constraint['columns'] and (constraint['index'] or constraint['primary_key'] or constraint['unique'])
+            }
+        return self._indexed[table]
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def compare_reports(baseline, report):
+    """
+    Lists regressions of ``report`` against an earlier ``baseline`` report:
+    new findings, extra queries, and scenarios that started failing.
+    Returns a list of messages.
+    """
+    messages = []
+    for name, scenario in report['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        if scenario['error'] and not before['error']:
+            messages.append(f"{name}: now fails with {scenario['error']}")
+        if scenario['query_count'] > before['query_count']:
+            messages.append(f"{name}: {before['query_count']} -> {scenario['query_count']} queries")
+        known = {_finding_key(finding) for finding in before['findings']}
+        for finding in scenario['findings']:
+            if _finding_key(finding) not in known:
+                messages.append(f'{name}: new {describe_finding(finding)}')
+                known.add(_finding_key(finding))
+    return messages
+
+
+def _finding_key(finding):
+    return finding['type'], finding['table'], tuple(finding.get('columns', ()))
+
+
+def describe_finding(finding):
+    if finding['type'] == 'seq_scan':
+        return f"full scan of {finding['table']} ({finding['rows']} rows)"
+    return f"unindexed filter on {finding['table']}({', '.join(finding['columns'])})"
+
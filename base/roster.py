@@ -0,0 +1,169 @@
+import csv
+import io
+import os
+
+from django.db import router, transaction
+
+from .changes import records_changed
+from .models import AddressZW, Program, Stream, Student
+
+# Maps normalised spreadsheet headers to Student/AddressZW fields.
+# Headers are lower-cased and spaces replaced with underscores, so the
+# "Student ID" column written by generate_students_csv maps to "student_id".
+STUDENT_COLUMNS = [
+    'student_id', 'first_name', 'last_name', 'gender', 'national_id',
+    'phone_number', 'parent_name', 'parent_phone_number',
+]
+ADDRESS_COLUMNS = ['address_line_1', 'address_line_2', 'city', 'province', 'postal_code']
+
+BATCH_SIZE = 1000
+
+
+def _normalise_header(header):
+    return header.strip().lower().replace(' ', '_')
+
+
+def read_roster_rows(path_or_file, filename=None):
+    """
+    Reads a roster from a CSV or XLSX file.
+    Parameters:
+        - path_or_file (str or file): Path to the roster, or an open binary file.
+        - filename (str): Name used to detect the format when a file object is passed.
+    Returns a list of dicts keyed by normalised column name.
+    """
+    name = filename or (path_or_file if isinstance(path_or_file, str) else getattr(path_or_file, 'name', ''))
+    if name.lower().endswith('.xlsx'):
+        return _read_xlsx(path_or_file)
+    return _read_csv(path_or_file)
+
+
+def _read_csv(path_or_file):
+    if isinstance(path_or_file, str):
+        with open(path_or_file, newline='', encoding='utf-8-sig') as csv_file:
+            return _rows_from_csv(csv_file)
+    csv_file = io.TextIOWrapper(path_or_file, encoding='utf-8-sig', newline='')
+    try:
+        return _rows_from_csv(csv_file)
+    finally:
+        # Leave the caller's file open
+        csv_file.detach()
+
+
+def _rows_from_csv(csv_file):
+    reader = csv.reader(csv_file)
+    header = next(reader, None)
+    if header is None:
+        return []
+    keys = [_normalise_header(h) for h in header]
+    return [dict(zip(keys, (value.strip() for value in row))) for row in reader if any(row)]
+
+
+def _read_xlsx(path_or_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Importing XLSX rosters requires the openpyxl package.')
+
+    workbook = load_workbook(path_or_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return []
+        keys = [_normalise_header(str(h or '')) for h in header]
+        return [
+            dict(zip(keys, ('' if value is None else str(value).strip() for value in row)))
+            for row in rows if any(value not in (None, '') for value in row)
+        ]
+    finally:
+        workbook.close()
+
+
+def import_roster(rows, program=None, stream=None, enroll_in_courses=False, batch_size=BATCH_SIZE):
+    """
+    Creates addresses, students and their program/stream links in bulk.
+    Rows whose national ID already exists (in the database or earlier in the
+    same roster) are skipped; existing national and student IDs are loaded once
+    up front. Student IDs identify students in mark sheets, so a row whose
+    student ID is already taken by another student is rejected.
+    Parameters:
+        - rows (iterable of dict): Roster rows keyed by normalised column name.
+        - program (Program): Program applied to rows without a "program" column value.
+        - stream (Stream): Stream applied to rows without a "stream" column value.
+        - enroll_in_courses (bool): Also enroll new students in their program's courses.
+        - batch_size (int): Number of rows per bulk insert.
+    Returns a dict with the created students, the skipped count and the line
+    numbers of invalid rows and of rows with a duplicate student ID.
+    """
+    existing_ids = set(Student.objects.values_list('national_id', flat=True))
+    student_ids = set(Student.objects.values_list('student_id', flat=True))
+    programs = {p.name: p for p in Program.objects.all()}
+    streams = {s.name: s for s in Stream.objects.all()}
+
+    addresses = []
+    students = []
+    skipped = 0
+    invalid = []
+    duplicates = []
+    for line, row in enumerate(rows, start=2):
+        national_id = row.get('national_id', '')
+        if not national_id or not row.get('student_id'):
+            invalid.append(line)
+            continue
+        if national_id in existing_ids:
+            skipped += 1
+            continue
+        if row['student_id'] in student_ids:
+            duplicates.append(line)
+            continue
+        existing_ids.add(national_id)
+        student_ids.add(row['student_id'])
+
+        addresses.append(AddressZW(**{field: row.get(field, '') for field in ADDRESS_COLUMNS}))
+        students.append(Student(
+            program=programs.get(row.get('program')) or program,
+            class_year=streams.get(row.get('stream')) or stream,
+            **{field: row.get(field, '') for field in STUDENT_COLUMNS}
+        ))
+
+    with transaction.atomic(using=router.db_for_write(Student)):
+        AddressZW.objects.bulk_create(addresses, batch_size=batch_size)
+        for student, address in zip(students, addresses):
+            student.address = address
+        Student.objects.bulk_create(students, batch_size=batch_size)
+        if enroll_in_courses:
+            _enroll_in_program_courses(students, batch_size)
+        if students:
+            records_changed()
+
+    return {'created': students, 'skipped': skipped, 'invalid': invalid, 'duplicates': duplicates}
+
+
+def _enroll_in_program_courses(students, batch_size):
+    program_ids = {s.program_id for s in students if s.program_id}
+    courses_by_program = {}
+    ProgramCourses = Program.courses.through
+    for program_id, course_id in ProgramCourses.objects.filter(
+            program_id__in=program_ids).values_list('program_id', 'course_id'):
+        courses_by_program.setdefault(program_id, []).append(course_id)
+
+    Through = Student.courses.through
+    Through.objects.bulk_create(
+        [Through(student_id=s.pk, course_id=course_id)
+         for s in students
+         for course_id in courses_by_program.get(s.program_id, [])],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def import_roster_file(path, **kwargs):
+    """
+    Reads a CSV/XLSX roster from disk and imports it with ``import_roster``.
+    Parameters:
+        - path (str): Path to the roster file.
+    Returns the summary dict produced by ``import_roster``.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return import_roster(read_roster_rows(path), **kwargs)
@@ -0,0 +1,155 @@
+"""
+Group-wide reports across school databases and moving schools between databases.
+"""
+import tempfile
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .changes import marks_changed, records_changed
+from .models import AddressZW, Course, Mark, RestoredDump, School, Stream, Student, Teacher
+from .sharding import for_each_school, is_sharded, use_school
+from .transfer import dump, restore, table_name, transfer_models
+
+
+def school_summary():
+    """
+    Returns headline figures for the active school's database.
+    """
+    marks = Mark.objects.aggregate(count=Count('id'), sum=Sum('mark'), highest=Max('mark'), lowest=Min('mark'))
+    return {
+        'students': Student.objects.count(),
+        'courses': Course.objects.count(),
+        'marks': marks['count'],
+        'sum': marks['sum'] or 0,
+        'highest_mark': marks['highest'],
+        'lowest_mark': marks['lowest'],
+    }
+
+
+def course_totals():
+    """
+    Returns {course code: (mark count, mark sum)} for the active school's database.
+    """
+    return {
+        code: (count, total)
+        for code, count, total in Mark.objects.values('course__code')
+        .annotate(count=Count('id'), total=Sum('mark')).values_list('course__code', 'count', 'total')
+    }
+
+
+def group_report(workers=4):
+    """
+    Builds a report over every school, querying the school databases concurrently.
+    Per-school results are merged from counts and sums, so group averages are
+    exact rather than averages of averages.
+    Parameters:
+        - workers (int): Number of school databases queried at the same time.
+    Returns a dict with per-school figures, group totals and per-course-code averages.
+    """
+    summaries = for_each_school(school_summary, workers=workers)
+    courses = {}
+    for totals in for_each_school(course_totals, workers=workers).values():
+        for code, (count, total) in totals.items():
+            merged = courses.setdefault(code, [0, 0])
+            merged[0] += count
+            merged[1] += total
+
+    highest = [s['highest_mark'] for s in summaries.values() if s['highest_mark'] is not None]
+    lowest = [s['lowest_mark'] for s in summaries.values() if s['lowest_mark'] is not None]
+    marks = sum(s['marks'] for s in summaries.values())
+    total = sum(s['sum'] for s in summaries.values())
+    return {
+        'schools': {
+            code: {**summary, 'average_mark': summary['sum'] / summary['marks'] if summary['marks'] else None}
+            for code, summary in summaries.items()
+        },
+        'total': {
+            'students': sum(s['students'] for s in summaries.values()),
+            'marks': marks,
+            'average_mark': total / marks if marks else None,
+            'highest_mark': max(highest) if highest else None,
+            'lowest_mark': min(lowest) if lowest else None,
+        },
+        'courses': {
+            code: {'marks': count, 'average_mark': total / count}
+            for code, (count, total) in sorted(courses.items()) if count
+        },
+    }
+
+
+def school_models():
+    return [model for model in transfer_models() if is_sharded(model)]
+
+
+def _row_counts(using):
+    return {table_name(model): model._base_manager.using(using).count() for model in school_models()}
+
+
+def move_school(school, target, jobs=4, delete_source=False, stdout=None):
+    """
+    Copies a school's data to another database and points the school at it.
+    The copy is checked table by table before the switch; the school should be
+    quiet while it runs, as changes made during the copy are not carried over.
+    Parameters:
+        - school (School): School to move.
+        - target (str): Database alias to move the school to; it must hold no school data.
+        - jobs (int): Number of tables copied concurrently.
+        - delete_source (bool): Remove the school's rows from the old database afterwards.
+        - stdout: Optional stream for progress messages.
+    Returns the number of rows copied.
+    """
+    source = school.database
+    if target not in settings.DATABASES:
+        raise ValueError(f'Unknown database {target}')
+    if target == source:
+        raise ValueError(f'{school.code} already uses {target}')
+    owner = School.objects.filter(database=target).first()
+    if owner is not None:
+        raise ValueError(f'{target} already holds {owner.code}')
+    before = _row_counts(target)
+    # Addresses may belong to teachers when the target is the default database
+    if any(count for table, count in before.items() if table != table_name(AddressZW)):
+        raise ValueError(f'{target} already holds school data')
+
+    expected = _row_counts(source)
+    # COPY keeps ids, so it needs truly empty tables; the jsonl format remaps them.
+    copy = connections[source].vendor == connections[target].vendor == 'postgresql' and not any(before.values())
+    with tempfile.TemporaryDirectory() as directory:
+        dump(directory, fmt='copy' if copy else 'jsonl', jobs=jobs, using=source)
+        restore(directory, jobs=jobs, stdout=stdout, using=target)
+
+    copied = {table: count - before[table] for table, count in _row_counts(target).items()}
+    if copied != expected:
+        raise ValueError(f'Copy of {school.code} to {target} is incomplete: expected {expected}, found {copied}')
+
+    school.database = target
+    school.save(update_fields=['database'])
+    with use_school(school):
+        # Restored rows may have new ids; drop caches derived from the old ones.
+        Stream.clear_current_streams_cache()
+        marks_changed()
+        records_changed()
+
+    if delete_source:
+        delete_school_data(source)
+    return sum(copied.values())
+
+
+def delete_school_data(using):
+    """
+    Removes all school data from a database, keeping the addresses of teachers
+    (the directory lives in the default database).
+    """
+    connection = connections[using]
+    # Records of restored dumps go too, so the dumps can be loaded again
+    models = [model for model in school_models() if model is not AddressZW] + [RestoredDump]
+    with transaction.atomic(using=using):
+        connection.ops.execute_sql_flush(
+            connection.ops.sql_flush(no_style(), [table_name(model) for model in models])
+        )
+        AddressZW.objects.using(using).exclude(
+            pk__in=Teacher.objects.using(using).exclude(address=None).values('address')
+        ).delete()
@@ -0,0 +1,108 @@
+"""
+Fake data helpers for seeding development databases.
+
+Faker is only imported the first time fake data is generated, so importing this
+module (or the commands that use it) doesn't slow down or break processes that
+never seed anything, and Faker stays a development-only dependency.
+"""
+import random
+
+from django.contrib.auth.models import User
+
+from .models import AddressZW, Course, Mark, Program, Stream, Student, Teacher
+
+_fake = None
+
+
+def get_faker():
+    """
+    Returns a shared Faker instance, importing Faker on first use.
+    """
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+    return _fake
+
+
+def create_fake_address():
+    fake = get_faker()
+    return AddressZW.objects.create(
+        address_line_1=fake.street_address(),
+        address_line_2=fake.secondary_address() if random.choice([True, False]) else '',
+        city=fake.city(),
+        province=fake.state(),
+        postal_code=fake.zipcode(),
+    )
+
+
+def create_fake_stream():
+    fake = get_faker()
+    return Stream.objects.create(
+        name=fake.word(),
+        start_date=fake.date_between(start_date='-1y', end_date='-1d'),
+        end_date=fake.date_between(start_date='+1d', end_date='+1y'),
+    )
+
+
+def create_fake_course():
+    fake = get_faker()
+    return Course.objects.create(
+        code=fake.unique.random_number(digits=5),
+        name=fake.catch_phrase(),
+        description=fake.paragraph(),
+    )
+
+
+def create_fake_program():
+    fake = get_faker()
+    program = Program.objects.create(name=fake.job(), description=fake.paragraph())
+    program.courses.set(Course.objects.order_by('?')[:random.randint(1, 5)])
+    return program
+
+
+def create_fake_student():
+    fake = get_faker()
+    gender = random.choice(['M', 'F'])
+    return Student.objects.create(
+        student_id=fake.unique.random_number(digits=8),
+        first_name=fake.first_name_male() if gender == 'M' else fake.first_name_female(),
+        last_name=fake.last_name(),
+        program=Program.objects.order_by('?').first(),
+        gender=gender,
+        national_id=fake.unique.random_number(digits=10),
+        address=AddressZW.objects.order_by('?').first() or create_fake_address(),
+        phone_number=fake.phone_number()[:15],
+        parent_name=fake.name(),
+        parent_phone_number=fake.phone_number()[:15],
+        class_year=Stream.objects.order_by('?').first(),
+    )
+
+
+def create_fake_teacher():
+    fake = get_faker()
+    user = User.objects.create_user(
+        username=fake.unique.user_name(),
+        first_name=fake.first_name(),
+        last_name=fake.last_name(),
+        email=fake.email(),
+        password=fake.password(),
+    )
+    return Teacher.objects.create(
+        user=user,
+        date_of_birth=fake.date_of_birth(minimum_age=25, maximum_age=65),
+        gender=random.choice(['M', 'F']),
+        national_id=fake.unique.random_number(digits=10),
+        phone_number=fake.phone_number()[:20],
+        address=create_fake_address(),
+        qualifications=fake.paragraph(),
+        years_of_experience=random.randint(1, 20),
+    )
+
+
+def create_fake_mark():
+    return Mark.objects.create(
+        student=Student.objects.order_by('?').first(),
+        course=Course.objects.order_by('?').first(),
+        mark=random.randint(0, 100),
+    )
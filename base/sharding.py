@@ -0,0 +1,198 @@
+"""
+Routing of school data to per-school databases.
+
+Every school (base.models.School) names the database alias that holds its
+streams, courses, programs, students, marks and everything hanging off them.
+Schools, teachers and auth users form a directory that stays in the default
+database. The active school is held in a context variable:
+
+- SchoolMiddleware activates the signed-in teacher's school for each request.
+- Management commands and background jobs use ``use_school``.
+
+SchoolRouter sends queries for sharded models to the active school's database.
+With no school active, everything uses the default database, so a
+single-school deployment needs no configuration.
+"""
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import Http404
+
+# Models kept in the default database, by label_lower. Everything else in the
+# base app, including auto-created link tables, lives with its school.
+DIRECTORY_MODELS = {'base.school', 'base.teacher'}
+
+# Teachers keep their addresses in the default database too (see Teacher.save)
+TEACHER_ADDRESS = {'base.teacher', 'base.addresszw'}
+
+SCHOOL_SESSION_KEY = 'school'
+
+_active_school = contextvars.ContextVar('markcraft_school', default=None)
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'base' and model._meta.label_lower not in DIRECTORY_MODELS
+
+
+def current_school():
+    """
+    Returns the active School, or None.
+    """
+    return _active_school.get()
+
+
+def school_database(school=None):
+    """
+    Returns the database alias of a school (default: the active school).
+    """
+    school = school or current_school()
+    return school.database if school is not None else DEFAULT_DB_ALIAS
+
+
+def get_school(code):
+    """
+    Looks up a school by code.
+    Raises School.DoesNotExist for unknown codes.
+    """
+    from .models import School
+    return School.objects.get(code=code)
+
+
+@contextlib.contextmanager
+def use_school(school):
+    """
+    Activates a school for the enclosed block.
+    Parameters:
+        - school (School, str or None): School or school code; None activates the default database.
+    """
+    if isinstance(school, str):
+        school = get_school(school)
+    token = _active_school.set(school)
+    try:
+        yield school
+    finally:
+        _active_school.reset(token)
+
+
+class SchoolRouter:
+    """
+    Database router sending sharded models to the active school's database.
+    Related objects are read from the database their parent came from, so a
+    student loaded from one school never fetches marks from another.
+    """
+
+    def _db_for(self, model, hints):
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.app_label == 'base' and instance._state.db:
+            return instance._state.db
+        return school_database()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # References to users cross databases (the foreign keys carry no
+        # constraint); rows of the base app must stay together, except that
+        # Teacher.save() first moves a teacher's address into its database.
+        if obj1._meta.app_label == 'base' and obj2._meta.app_label == 'base':
+            if {obj1._meta.label_lower, obj2._meta.label_lower} == TEACHER_ADDRESS:
+                return True
+            return obj1._state.db == obj2._state.db
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every database gets the full schema; unused tables simply stay empty.
+        return None
+
+
+def school_cache_key(key, key_prefix, version):
+    """
+    Cache KEY_FUNCTION that namespaces entries by the active school, so
+    version tokens and cached fragments of one school never serve another.
+    """
+    school = current_school()
+    return f"{key_prefix}:{version}:{school.code if school is not None else ''}:{key}"
+
+
+def school_for_request(request):
+    """
+    Returns the school a request works on: the signed-in teacher's school,
+    or for staff the school picked with ``?school=<code>`` (remembered in the session).
+    Raises Http404 for an unknown school code.
+    """
+    from accounts.teachers import get_current_teacher
+    from .models import School
+
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if user.is_staff:
+        code = request.GET.get(SCHOOL_SESSION_KEY)
+        if code:
+            school = School.objects.filter(code=code).first()
+            if school is None:
+                raise Http404(f'Unknown school {code}')
+            request.session[SCHOOL_SESSION_KEY] = code
+            return school
+        if code == '':
+            # ?school= clears the choice
+            request.session.pop(SCHOOL_SESSION_KEY, None)
+        code = request.session.get(SCHOOL_SESSION_KEY)
+        if code:
+            school = School.objects.filter(code=code).first()
+            if school is not None:
+                return school
+            # The school was removed since it was picked
+            del request.session[SCHOOL_SESSION_KEY]
+    teacher = get_current_teacher(request)
+    return teacher.school if teacher is not None else None
+
+
+class SchoolMiddleware:
+    """
+    Activates the school of the signed-in user for the rest of the request.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.school = school_for_request(request)
+        with use_school(request.school):
+            return self.get_response(request)
+
+
+def for_each_school(fn, schools=None, workers=4):
+    """
+    Runs ``fn()`` once per school, with the school active, across a thread pool.
+    Each thread uses its own database connections.
+    Parameters:
+        - fn (callable): Function taking no arguments.
+        - schools (iterable of School): Schools to visit (default: all of them).
+        - workers (int): Number of schools queried concurrently.
+    Returns a dict {school code: result}. Without any schools, ``fn`` runs once
+    against the default database under the key None.
+    """
+    from .models import School
+
+    schools = list(School.objects.order_by('code') if schools is None else schools)
+    if not schools:
+        return {None: fn()}
+
+    def run(school):
+        try:
+            with use_school(school):
+                return fn()
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(schools)))) as pool:
+        return dict(zip([school.code for school in schools], pool.map(run, schools)))
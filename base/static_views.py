@@ -0,0 +1,74 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Files fingerprinted by ManifestStaticFilesStorage, e.g. markcraft.min.3f2a1b9c0d4e.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+FAR_FUTURE_CACHE = 'public, max-age=31536000, immutable'
+SHORT_CACHE = 'public, max-age=300'
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header into the set of codings the client takes.
+    Codings sent with q=0 are refused, and ``*`` stands for any coding not
+    listed explicitly.
+    """
+    weights = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    accepted = {coding for coding, q in weights.items() if q > 0}
+    if '*' in accepted:
+        accepted.update(name for name, _ in ENCODINGS if name not in weights)
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Serves a file from STATIC_ROOT, preferring a precompressed .br/.gz variant
+    the client accepts. Fingerprinted files are cached by browsers for a year.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    served_path, encoding = full_path, None
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            served_path, encoding = full_path + suffix, name
+            break
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Last-Modified'] = http_date(os.path.getmtime(full_path))
+    response.headers['Cache-Control'] = FAR_FUTURE_CACHE if HASHED_NAME_RE.search(path) else SHORT_CACHE
+    return response
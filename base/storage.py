@@ -0,0 +1,42 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes .gz (and .br, when brotli is installed)
+    next to every hashed text asset, so they can be served without compressing
+    on each request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self._write_compressed(hashed_name)
+
+    def _write_compressed(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        with open(path + '.gz', 'wb') as f:
+            # mtime=0 keeps the output reproducible between builds
+            with gzip.GzipFile(filename=os.path.basename(path), fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+                gz.write(content)
+
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
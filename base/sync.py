@@ -0,0 +1,306 @@
+"""
+Delta sync of marks for offline clients.
+
+Every change to a mark is recorded in the append-only MarkAudit log, so the
+audit id doubles as a change sequence:
+
+- A sync token is the audit id up to which a client has seen the changes of
+  its scope (a stream, optionally narrowed to some courses).
+- A mark's version is the id of its latest audit entry.
+
+A client sends the changes it made offline, each carrying the version it
+edited. The server applies them in bulk and rejects any change whose mark has
+moved on since that version. It answers with the changes made since the
+client's token as compact rows, plus a new token.
+
+New marks carry a client-generated UUID, stored with the mark, so a request
+retried after its response was lost returns the marks created the first time
+instead of creating them again.
+
+Audit ids are handed out when entries are inserted, not when their transaction
+commits, so a token may overtake an entry that is still uncommitted (see
+SETTLE_SECONDS). Clients should therefore also run a full download (no token)
+from time to time, e.g. daily.
+"""
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .changes import marks_changed
+from .events import marks_delta
+from .models import Assessment, Course, Mark, MarkAudit, Student
+from .sharding import school_database
+
+# Columns of the mark rows in a changeset
+COLUMNS = ['id', 'student', 'course', 'assessment', 'mark', 'version']
+
+# Audit ids are allocated before their transaction commits, so an entry
+# younger than this may still be joined by entries with lower ids. Tokens stop
+# short of them; clients receive those changes again on their next sync.
+# This is a heuristic: a transaction running longer than the window can still
+# commit entries below an issued token, and clients only see those changes on
+# their next full download.
+SETTLE_SECONDS = 10
+
+
+class SyncError(ValueError):
+    """
+    Raised for malformed sync requests.
+    """
+
+
+def sync_marks(stream, token=None, changes=(), courses=None, user=None):
+    """
+    Applies a client's offline changes and returns what changed on the server.
+    Parameters:
+        - stream (Stream): Stream whose marks the client keeps.
+        - token (str): Token returned by the previous sync; None for a full download.
+        - changes (list of dict): Client changes, each one of
+            {"id", "version", "mark"} to update a mark,
+            {"id", "version", "deleted": true} to delete one,
+            {"ref", "student", "course", "mark"[, "assessment"]} to create one
+            ("ref" is a UUID generated by the client, echoed back with the new id).
+        - courses (list of str): Limit the scope to these course codes.
+        - user (User): User recorded as the author of the changes.
+    Returns the response dict (see COLUMNS for the layout of mark rows).
+    """
+    since = parse_token(token)
+    scope = Mark.objects.filter(student__class_year=stream)
+    if courses:
+        scope = scope.filter(course__code__in=courses)
+
+    result = {'created': {}, 'updated': {}, 'deleted': [], 'conflicts': [], 'errors': []}
+    with transaction.atomic(using=router.db_for_write(Mark)):
+        own_audits = _apply(stream, scope, list(changes), user, result)
+
+    response = {
+        'applied': {'created': result['created'], 'updated': result['updated'], 'deleted': result['deleted']},
+        'conflicts': result['conflicts'],
+        'errors': result['errors'],
+        'columns': COLUMNS,
+    }
+    response.update(_changeset(stream, scope, since, own_audits, courses))
+    response['token'] = make_token(_settled_audit_id())
+    return response
+
+
+def make_token(audit_id):
+    return f'{school_database()}:{audit_id}'
+
+
+def parse_token(token):
+    """
+    Returns the audit id of a token, or None when the client needs a full
+    download (no token, or one issued by another database).
+    """
+    if not token:
+        return None
+    database, _, audit_id = str(token).rpartition(':')
+    if database != school_database() or not audit_id.isdigit():
+        return None
+    return int(audit_id)
+
+
+def _settled_audit_id():
+    cutoff = timezone.now() - timezone.timedelta(seconds=SETTLE_SECONDS)
+    recent = list(MarkAudit.objects.order_by('-pk').values_list('pk', 'changed_at')[:1000])
+    for pk, changed_at in recent:
+        if changed_at <= cutoff:
+            return pk
+    return recent[-1][0] - 1 if recent else 0
+
+
+def _versions(mark_ids):
+    return dict(
+        MarkAudit.objects.filter(mark_id__in=mark_ids)
+        .values('mark_id').annotate(version=Max('pk')).values_list('mark_id', 'version')
+    )
+
+
+def _row(mark, version):
+    return [mark.pk, mark.student.student_id, mark.course.code,
+            mark.assessment.name if mark.assessment_id else None, str(mark.mark), version or 0]
+
+
+def _parse_mark(value):
+    try:
+        mark = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise SyncError(f'Invalid mark value {value!r}')
+    if not mark.is_finite() or mark < 0 or mark >= 1000 or mark.as_tuple().exponent < -2:
+        raise SyncError(f'Invalid mark value {value!r}')
+    return mark
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return True
+
+
+def _change_error(change):
+    """
+    Returns why a change is malformed, or None.
+    """
+    if not isinstance(change, dict):
+        return 'Expected an object'
+    if 'id' in change:
+        if not _is_int(change['id']) or not _is_int(change.get('version')):
+            return '"id" and "version" must be integers'
+        if not isinstance(change.get('deleted', False), bool):
+            return '"deleted" must be true or false'
+        return None
+    if not isinstance(change.get('ref'), str) or not _is_uuid(change['ref']):
+        return 'New marks need a "ref" UUID'
+    if not isinstance(change.get('student'), str) or not isinstance(change.get('course'), str):
+        return '"student" and "course" must be strings'
+    if not isinstance(change.get('assessment') or '', str):
+        return '"assessment" must be a string'
+    return None
+
+
+def _apply(stream, scope, changes, user, result):
+    """
+    Applies the changes in bulk: one query each to load marks, versions,
+    students, courses and assessments, then bulk writes.
+    Returns the ids of the audit entries written.
+    """
+    edits, creates = [], []
+    for index, change in enumerate(changes):
+        error = _change_error(change)
+        if error:
+            result['errors'].append({'index': index, 'error': error})
+        else:
+            (edits if 'id' in change else creates).append(change)
+
+    # Row locks keep a concurrent sync from passing the same version check
+    marks = scope.select_related('student', 'course', 'assessment').select_for_update(of=('self',)).in_bulk(
+        [change['id'] for change in edits]
+    )
+    versions = _versions(list(marks))
+
+    updated, deleted, audits = [], [], []
+    for change in edits:
+        mark = marks.get(change['id'])
+        if mark is None:
+            result['conflicts'].append({'id': change['id'], 'reason': 'missing', 'server': None})
+            continue
+        if versions.get(mark.pk, 0) != change.get('version'):
+            result['conflicts'].append({
+                'id': mark.pk, 'reason': 'changed', 'server': _row(mark, versions.get(mark.pk)),
+            })
+            continue
+        if change.get('deleted'):
+            deleted.append(mark)
+            audits.append(MarkAudit.entry_for(mark, MarkAudit.DELETED, old_value=mark.mark, user=user))
+            continue
+        try:
+            value = _parse_mark(change.get('mark'))
+        except SyncError as e:
+            result['errors'].append({'id': mark.pk, 'error': str(e)})
+            continue
+        old_value, mark.mark = mark.mark, value
+        updated.append(mark)
+        audits.append(MarkAudit.entry_for(mark, MarkAudit.UPDATED, old_value=old_value, user=user))
+
+    created, replayed = _create(stream, creates, result)
+    audits.extend(MarkAudit.entry_for(mark, MarkAudit.CREATED, user=user) for _, mark in created)
+
+    Mark.objects.bulk_update(updated, ['mark'])
+    audits = MarkAudit.objects.bulk_create(audits)
+    Mark.objects.filter(pk__in=[mark.pk for mark in deleted]).delete()
+
+    versions = {audit.mark_id: audit.pk for audit in audits}
+    result['updated'] = {mark.pk: versions[mark.pk] for mark in updated}
+    result['deleted'] = [mark.pk for mark in deleted]
+    result['created'] = {ref: [mark.pk, versions[mark.pk]] for ref, mark in created}
+    replayed_versions = _versions(replayed.values())
+    result['created'].update({ref: [pk, replayed_versions.get(pk, 0)] for ref, pk in replayed.items()})
+    if created:
+        marks_changed(marks_delta([mark for _, mark in created]))
+    if updated:
+        marks_changed()
+    return {audit.pk for audit in audits}
+
+
+def _create(stream, creates, result):
+    """
+    Creates new marks with one bulk insert.
+    Returns ([(ref, Mark)] created, {ref: mark id} of marks a retried request created before).
+    """
+    if not creates:
+        return [], {}
+    refs = {change['ref']: uuid.UUID(change['ref']) for change in creates}
+    existing = dict(Mark.objects.filter(sync_ref__in=refs.values()).values_list('sync_ref', 'pk'))
+    students = dict(Student.objects.filter(
+        class_year=stream, student_id__in={change['student'] for change in creates},
+    ).values_list('student_id', 'pk'))
+    courses = dict(Course.objects.filter(
+        code__in={change['course'] for change in creates},
+    ).values_list('code', 'pk'))
+    assessments = {
+        (course_id, name): pk
+        for pk, course_id, name in Assessment.objects.filter(course_id__in=courses.values())
+        .values_list('pk', 'course_id', 'name')
+    }
+
+    created, replayed, seen = [], {}, set()
+    for change in creates:
+        ref = change['ref']
+        if refs[ref] in existing:
+            replayed[ref] = existing[refs[ref]]
+            continue
+        course_id = courses.get(change['course'])
+        assessment = change.get('assessment')
+        try:
+            if refs[ref] in seen:
+                raise SyncError(f'Duplicate ref {ref}')
+            if change['student'] not in students:
+                raise SyncError(f"Unknown student {change['student']} in this stream")
+            if course_id is None:
+                raise SyncError(f"Unknown course {change['course']}")
+            if assessment and (course_id, assessment) not in assessments:
+                raise SyncError(f"Unknown assessment {assessment} for course {change['course']}")
+            value = _parse_mark(change.get('mark'))
+        except SyncError as e:
+            result['errors'].append({'ref': ref, 'error': str(e)})
+            continue
+        seen.add(refs[ref])
+        created.append((ref, Mark(
+            student_id=students[change['student']], course_id=course_id, mark=value,
+            assessment_id=assessments.get((course_id, assessment)), sync_ref=refs[ref],
+        )))
+    Mark.objects.bulk_create([mark for _, mark in created])
+    return created, replayed
+
+
+def _changeset(stream, scope, since, own_audits, courses):
+    """
+    Returns the marks of the scope changed after audit id ``since`` (all of
+    them when since is None), leaving out changes the client just made itself.
+    """
+    if since is None:
+        marks = list(scope.select_related('student', 'course', 'assessment').order_by('pk'))
+        versions = _versions([mark.pk for mark in marks])
+        return {'reset': True, 'marks': [_row(mark, versions.get(mark.pk)) for mark in marks], 'removed': []}
+
+    audits = MarkAudit.objects.filter(pk__gt=since, student__class_year=stream).exclude(pk__in=own_audits)
+    if courses:
+        audits = audits.filter(course__code__in=courses)
+    changed_ids = set(audits.exclude(mark=None).values_list('mark_id', flat=True))
+    marks = scope.select_related('student', 'course', 'assessment').in_bulk(changed_ids)
+    versions = _versions(list(marks))
+    return {
+        'reset': False,
+        'marks': [_row(marks[pk], versions.get(pk)) for pk in sorted(marks)],
+        'removed': sorted(changed_ids - set(marks)),
+    }
@@ -1,3 +1,1135 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+import uuid
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.http import parse_http_date
+
+from accounts.backends import TeacherModelBackend
+from . import transfer
+from .changes import bump_marks_version, marks_version, records_version
+from .events import mark_statistics, marks_delta
+from .gradebook import Gradebook
+from .grading import compute_final_marks, compute_stream_grades
+from .management.commands.profile_startup import parse_importtime
+from .mark_views import dashboard_events
+from .marks_import import import_mark_files, import_mark_rows, import_upload, parse_mark_rows
+from .models import (AddressZW, Assessment, Course, FinalGrade, Mark, MarkAudit, Program, RestoredDump, School, Stream,
+                     Student, Teacher)
+from .query_plans import _Explainer, capture
+from .roster import import_roster, read_roster_rows
+from .schools import delete_school_data, move_school
+from .sharding import SchoolMiddleware, for_each_school, school_cache_key, use_school
+from .static_views import accepted_encodings, serve_static
+from .storage import PrecompressedManifestStaticFilesStorage, brotli
+from .uploads import compress_upload, store_upload, upload_path
+
+# Multi-database tests run against the shards named in DB_SHARDS,
+# e.g. DB_SHARDS=north,south DB_ENGINE=django.db.backends.sqlite3.
+SHARDS = ['north', 'south']
+SHARD_DATABASES = {'default', *SHARDS} & set(settings.DATABASES)
+requires_shards = unittest.skipUnless(len(SHARD_DATABASES) == 3, 'needs DB_SHARDS=north,south')
+
+# Pages render without a collectstatic manifest
+plain_static_files = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+def make_stream(name='Form 1'):
+    return Stream.objects.create(name=name, start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 1))
+
+
+def make_address():
+    return AddressZW.objects.create(address_line_1='1 Main Road', city='Harare', province='Harare', postal_code='0000')
+
+
+def make_student(stream, student_id, address=None):
+    return Student.objects.create(
+        student_id=student_id, first_name='Student', last_name=student_id, gender='F',
+        national_id=f'NID-{student_id}', address=address or make_address(), phone_number='0770000000',
+        parent_name='Parent', parent_phone_number='0770000001', class_year=stream,
+    )
+
+
+class StreamQuerySetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        day = datetime.timedelta(days=1)
+        self.current = Stream.objects.create(name='Current', start_date=self.today - day, end_date=self.today + day)
+        self.past = Stream.objects.create(name='Past', start_date=self.today - 10 * day, end_date=self.today - day)
+
+    def test_with_is_active(self):
+        streams = {stream.name: stream for stream in Stream.objects.with_is_active()}
+        with self.assertNumQueries(0):
+            self.assertTrue(streams['Current'].is_active())
+            self.assertFalse(streams['Past'].is_active())
+        later = Stream.objects.with_is_active(today=self.past.start_date).get(pk=self.past.pk)
+        self.assertTrue(later.is_active())
+
+    def test_current_ids_are_cached_for_the_day(self):
+        self.assertEqual(Stream.current_stream_ids(), [self.current.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(Stream.current_stream_ids(), [self.current.pk])
+        self.assertEqual(list(Stream.objects.current()), [self.current])
+
+    def test_save_and_delete_drop_the_cache(self):
+        Stream.current_stream_ids()
+        self.past.end_date = self.today
+        self.past.save()
+        self.assertEqual(sorted(Stream.current_stream_ids()), sorted([self.current.pk, self.past.pk]))
+        self.current.delete()
+        self.assertEqual(Stream.current_stream_ids(), [self.past.pk])
+
+
+class ProgramQuerySetTests(TestCase):
+    def test_with_counts_does_not_multiply(self):
+        stream = make_stream()
+        science = Program.objects.create(name='Science')
+        Program.objects.create(name='Arts')
+        science.courses.set([Course.objects.create(code=code, name=code) for code in ('MAT', 'PHY', 'CHE')])
+        science.enroll_students([make_student(stream, 'S1'), make_student(stream, 'S2')])
+
+        programs = {program.name: program for program in Program.objects.with_counts()}
+        self.assertEqual((programs['Science'].student_count, programs['Science'].course_count), (2, 3))
+        self.assertEqual((programs['Arts'].student_count, programs['Arts'].course_count), (0, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(programs['Science'].total_courses(), 3)
+
+
+class FinalGradeTests(TestCase):
+    def setUp(self):
+        self.stream = make_stream()
+        self.course = Course.objects.create(code='MAT', name='Mathematics')
+        self.first = make_student(self.stream, 'S1')
+        self.second = make_student(self.stream, 'S2')
+        self.test = Assessment.objects.create(course=self.course, name='Test 1', kind=Assessment.TEST, weight=40)
+        self.exam = Assessment.objects.create(course=self.course, name='Exam', kind=Assessment.EXAM, weight=60)
+
+    def mark(self, student, assessment, value):
+        return Mark.objects.create(student=student, course=self.course, assessment=assessment, mark=value)
+
+    def grade(self, student):
+        return FinalGrade.objects.get(student=student, course=self.course)
+
+    def test_weighted_final_mark(self):
+        self.mark(self.first, self.test, 50)
+        self.mark(self.first, self.exam, 80)
+        self.assertEqual(compute_final_marks(Student.objects.filter(pk=self.first.pk)),
+                         {(self.first.pk, self.course.pk): Decimal('68.00')})
+
+    def test_missed_assessment_counts_as_zero(self):
+        self.mark(self.first, self.exam, 50)
+        self.assertEqual(compute_final_marks(Student.objects.all())[self.first.pk, self.course.pk], Decimal('30.00'))
+
+    def test_assessments_with_the_same_weight_are_counted_separately(self):
+        self.exam.delete()
+        second_test = Assessment.objects.create(course=self.course, name='Test 2', kind=Assessment.TEST, weight=40)
+        self.mark(self.first, self.test, 100)
+        self.mark(self.first, second_test, 100)
+        compute_stream_grades(self.stream)
+        grade = self.grade(self.first)
+        self.assertEqual((grade.final_mark, grade.grade), (Decimal('100.00'), 'A'))
+
+    def test_max_mark_scales_the_average(self):
+        self.exam.delete()
+        self.test.max_mark = 50
+        self.test.save()
+        self.mark(self.first, self.test, 30)
+        self.mark(self.first, self.test, 40)
+        self.assertEqual(compute_final_marks(Student.objects.all())[self.first.pk, self.course.pk], Decimal('70.00'))
+
+    def test_only_changed_students_are_recomputed(self):
+        self.mark(self.first, self.test, 50)
+        self.mark(self.second, self.test, 60)
+        self.assertEqual(compute_stream_grades(self.stream), 2)
+        self.assertEqual(compute_stream_grades(self.stream), 0)
+
+        self.mark(self.second, self.exam, 90)
+        self.assertEqual(compute_stream_grades(self.stream), 1)
+        self.assertEqual(self.grade(self.second).final_mark, Decimal('78.00'))
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('20.00'))
+
+    def test_audited_update_recomputes_the_student(self):
+        mark = self.mark(self.first, self.exam, 50)
+        compute_stream_grades(self.stream)
+        old_value, mark.mark = mark.mark, Decimal('100')
+        Mark.objects.filter(pk=mark.pk).update(mark=mark.mark)
+        MarkAudit.entry_for(mark, MarkAudit.UPDATED, old_value=old_value).save()
+        self.assertEqual(compute_stream_grades(self.stream), 1)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('60.00'))
+
+    def test_new_assessment_without_marks_regrades_the_course(self):
+        self.exam.delete()
+        self.mark(self.first, self.test, 80)
+        self.mark(self.second, self.test, 40)
+        compute_stream_grades(self.stream)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('80.00'))
+
+        Assessment.objects.create(course=self.course, name='Exam', kind=Assessment.EXAM, weight=60)
+        self.assertEqual(compute_stream_grades(self.stream), 2)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('32.00'))
+        self.assertEqual(self.grade(self.second).final_mark, Decimal('16.00'))
+
+    def test_reweighting_and_removing_an_assessment_regrades_the_course(self):
+        self.mark(self.first, self.test, 50)
+        compute_stream_grades(self.stream)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('20.00'))
+
+        self.exam.weight = 10
+        self.exam.save()
+        self.assertEqual(compute_stream_grades(self.stream), 1)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('40.00'))
+
+        self.exam.delete()
+        self.assertEqual(compute_stream_grades(self.stream), 1)
+        self.assertEqual(self.grade(self.first).final_mark, Decimal('50.00'))
+
+    def test_grades_without_assessed_marks_are_dropped(self):
+        mark = self.mark(self.first, self.test, 50)
+        compute_stream_grades(self.stream)
+        MarkAudit.entry_for(mark, MarkAudit.DELETED, old_value=mark.mark).save()
+        mark.delete()
+        compute_stream_grades(self.stream)
+        self.assertFalse(FinalGrade.objects.filter(student=self.first).exists())
+
+
+def make_teacher(username, school=None, address=None):
+    user = User.objects.create_user(username=username, password='secret')
+    return Teacher.objects.create(
+        user=user, date_of_birth=datetime.date(1980, 1, 1), gender='M', national_id=f'NID-{username}',
+        phone_number='0770000000', address=address, school=school,
+        qualifications='BEd', years_of_experience=5,
+    )
+
+
+@requires_shards
+class SchoolRouterTests(TestCase):
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        self.north = School.objects.create(code='north', name='North High', database='north')
+        self.south = School.objects.create(code='south', name='South High', database='south')
+
+    def test_school_data_goes_to_the_school_database(self):
+        with use_school(self.north):
+            make_stream()
+            self.assertEqual(Stream.objects.count(), 1)
+        self.assertEqual(Stream.objects.using('north').count(), 1)
+        self.assertEqual(Stream.objects.using('south').count(), 0)
+        self.assertEqual(Stream.objects.count(), 0)
+
+    def test_directory_models_stay_in_the_default_database(self):
+        with use_school(self.north):
+            make_teacher('north-teacher', school=self.north)
+            School.objects.create(code='east', name='East High', database='east')
+        self.assertTrue(Teacher.objects.using('default').filter(user__username='north-teacher').exists())
+        self.assertEqual(School.objects.using('default').count(), 3)
+        self.assertFalse(Teacher.objects.using('north').exists())
+
+    def test_related_objects_are_read_from_their_parent_database(self):
+        with use_school(self.north):
+            student = make_student(make_stream('North stream'), 'N1')
+        with use_school(self.south):
+            make_stream('South stream')
+            student = Student.objects.using('north').get(pk=student.pk)
+            self.assertEqual(student.class_year.name, 'North stream')
+
+    def test_relations_across_school_databases_are_refused(self):
+        with use_school(self.north):
+            student = make_student(make_stream(), 'N1')
+        with use_school(self.south):
+            stream = make_stream()
+        with self.assertRaises(ValueError):
+            student.class_year = stream
+
+    def test_teacher_address_is_kept_in_the_default_database(self):
+        with use_school(self.north):
+            address = make_address()
+            self.assertEqual(address._state.db, 'north')
+            teacher = make_teacher('north-teacher', school=self.north, address=address)
+        self.assertEqual(teacher.address._state.db, 'default')
+        self.assertTrue(AddressZW.objects.using('default').filter(pk=teacher.address_id).exists())
+        self.assertFalse(AddressZW.objects.using('north').exists())
+
+        backend = TeacherModelBackend()
+        with self.assertNumQueries(1, using='default'):
+            user = backend.get_user(teacher.user_id)
+            self.assertEqual(user.teacher.address.city, 'Harare')
+            self.assertEqual(user.teacher.school.code, 'north')
+
+    def test_shared_student_address_stays_with_the_students(self):
+        with use_school(self.north):
+            address = make_address()
+            make_student(make_stream(), 'N1', address=address)
+            make_teacher('north-teacher', address=address)
+        self.assertTrue(AddressZW.objects.using('north').filter(pk=address.pk).exists())
+
+    def test_cache_keys_are_namespaced_by_school(self):
+        with use_school(self.north):
+            north = school_cache_key('marks', 'p', 1)
+        with use_school(self.south):
+            south = school_cache_key('marks', 'p', 1)
+        self.assertNotEqual(north, south)
+        self.assertNotEqual(school_cache_key('marks', 'p', 1), north)
+
+
+@requires_shards
+class SchoolMiddlewareTests(TestCase):
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        self.north = School.objects.create(code='north', name='North High', database='north')
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.middleware = SchoolMiddleware(lambda request: request.school)
+
+    def request(self, path, user, session=None):
+        request = RequestFactory().get(path)
+        request.user = user
+        request.session = {} if session is None else session
+        return request
+
+    def test_teacher_gets_their_school(self):
+        teacher = make_teacher('north-teacher', school=self.north)
+        self.assertEqual(self.middleware(self.request('/', teacher.user)), self.north)
+
+    def test_staff_pick_a_school(self):
+        session = {}
+        self.assertEqual(self.middleware(self.request('/?school=north', self.staff, session)), self.north)
+        self.assertEqual(self.middleware(self.request('/', self.staff, session)), self.north)
+        self.assertIsNone(self.middleware(self.request('/?school=', self.staff, session)))
+
+    def test_unknown_school_is_not_found(self):
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            self.middleware(self.request('/?school=nowhere', self.staff))
+
+    def test_unknown_school_returns_404(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/dashboard/?school=nowhere').status_code, 404)
+
+
+@requires_shards
+@plain_static_files
+class ShardAdminTests(TestCase):
+    databases = SHARD_DATABASES
+
+    def test_audit_users_come_from_the_default_database(self):
+        north = School.objects.create(code='north', name='North High', database='north')
+        author = User.objects.create_user(username='t1', password='secret')
+        with use_school(north):
+            mark = Mark.objects.create(student=make_student(make_stream(), 'S1'),
+                                       course=Course.objects.create(code='MAT', name='Mathematics'), mark=55)
+            MarkAudit.entry_for(mark, MarkAudit.CREATED, user=author).save()
+            MarkAudit.entry_for(mark, MarkAudit.UPDATED, old_value=Decimal('50')).save()
+
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        self.client.get('/admin/?school=north')  # remembered in the session
+        response = self.client.get('/admin/base/markaudit/')
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        self.assertContains(response, '<td class="field-changed_by nowrap">t1</td>', html=False)
+        response = self.client.get('/admin/base/markaudit/?q=t1')
+        self.assertEqual([entry.action for entry in response.context['cl'].result_list], [MarkAudit.CREATED])
+
+
+def _populate_school(school):
+    with use_school(school):
+        stream = make_stream()
+        course = Course.objects.create(code='MAT', name='Mathematics')
+        assessment = Assessment.objects.create(course=course, name='Exam', kind=Assessment.EXAM, weight=100)
+        students = [make_student(stream, f'{school.code}-{i}') for i in range(3)]
+        course.enroll_student(students)
+        for i, student in enumerate(students):
+            Mark.objects.create(student=student, course=course, assessment=assessment, mark=50 + i)
+        compute_stream_grades(stream)
+    return students
+
+
+@requires_shards
+class SchoolDatabaseTests(TransactionTestCase):
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        self.north = School.objects.create(code='north', name='North High', database='north')
+        self.south = School.objects.create(code='south', name='South High', database='south')
+
+    def test_for_each_school_runs_against_each_database(self):
+        _populate_school(self.north)
+        with use_school(self.south):
+            make_stream()
+            make_stream('Form 2')
+        counts = for_each_school(lambda: Stream.objects.count(), workers=2)
+        self.assertEqual(counts, {'north': 1, 'south': 2})
+
+    def test_for_each_school_without_schools_uses_the_default_database(self):
+        School.objects.all().delete()
+        make_stream()
+        self.assertEqual(for_each_school(lambda: Stream.objects.count()), {None: 1})
+
+    def test_move_school(self):
+        _populate_school(self.north)
+        self.south.delete()
+        copied = move_school(self.north, 'south', jobs=2)
+
+        self.north.refresh_from_db()
+        self.assertEqual(self.north.database, 'south')
+        self.assertGreater(copied, 0)
+        with use_school(self.north):
+            self.assertEqual(sorted(Mark.objects.values_list('student__student_id', 'mark')), [
+                ('north-0', Decimal('50.00')), ('north-1', Decimal('51.00')), ('north-2', Decimal('52.00')),
+            ])
+            self.assertEqual(Student.courses.through.objects.count(), 3)
+            self.assertEqual(FinalGrade.objects.count(), 3)
+        # The source is left alone unless asked
+        self.assertEqual(Mark.objects.using('north').count(), 3)
+
+    def test_move_school_deletes_the_source(self):
+        _populate_school(self.north)
+        self.south.delete()
+        move_school(self.north, 'south', delete_source=True)
+        for model in (AddressZW, Stream, Course, Student, Mark, FinalGrade):
+            self.assertFalse(model.objects.using('north').exists(), model.__name__)
+        self.assertEqual(Mark.objects.using('south').count(), 3)
+
+    def test_move_school_refuses_a_database_in_use(self):
+        _populate_school(self.north)
+        with self.assertRaisesMessage(ValueError, 'south already holds south'):
+            move_school(self.north, 'south')
+        with use_school(self.south):
+            make_stream()
+        self.south.delete()
+        with self.assertRaisesMessage(ValueError, 'already holds school data'):
+            move_school(self.north, 'south')
+
+    def test_delete_school_data_keeps_teacher_addresses(self):
+        make_student(make_stream(), 'D1')
+        teacher = make_teacher('teacher', address=make_address())
+        delete_school_data('default')
+        self.assertFalse(Student.objects.exists())
+        self.assertEqual(list(AddressZW.objects.values_list('pk', flat=True)), [teacher.address_id])
+
+
+@plain_static_files
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stream = make_stream()
+        self.client.force_login(User.objects.create_user(username='teacher', password='secret'))
+
+    def total_students(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return re.search(rb'data-stat="total_students">(\d+)<', response.content).group(1)
+
+    def test_student_changes_bump_the_records_version(self):
+        version = records_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            student = make_student(self.stream, 'S1')
+        self.assertNotEqual(records_version(), version)
+        version = records_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        self.assertNotEqual(records_version(), version)
+
+    def test_roster_import_bumps_the_records_version(self):
+        version = records_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            import_roster([{'student_id': 'R1', 'national_id': 'NID-R1', 'first_name': 'Rudo'}], stream=self.stream)
+        self.assertNotEqual(records_version(), version)
+
+    def test_cached_statistics_follow_the_student_count(self):
+        self.assertEqual(self.total_students(), b'0')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_student(self.stream, 'S1')
+        self.assertEqual(self.total_students(), b'1')
+        with self.captureOnCommitCallbacks(execute=True):
+            import_roster([{'student_id': 'R1', 'national_id': 'NID-R1'}], stream=self.stream)
+        self.assertEqual(self.total_students(), b'2')
+
+    def test_bench_dashboard_renders_cold_then_warm(self):
+        cache.set('unrelated', 1)
+        self.total_students()  # warms the fragments
+        out = io.StringIO()
+        call_command('bench_dashboard', iterations=3, stdout=out)
+        cold, warm = re.findall(r'(\d+) queries', out.getvalue())
+        self.assertGreater(int(cold), int(warm))
+        self.assertEqual(cache.get('unrelated'), 1)
+
+    def test_etag_changes_with_the_build(self):
+        etag = self.client.get('/dashboard/')['ETag']
+        with override_settings(BUILD_ID='release-2'):
+            response = self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('release-2', response['ETag'])
+            self.assertEqual(self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_validators_follow_student_and_course_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(code='MAT', name='Mathematics')
+        response = self.client.get('/dashboard/')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/dashboard/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        later = timezone.now() + datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                make_student(self.stream, 'S1')
+        response = self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(parse_http_date(response['Last-Modified']), int(later.timestamp()))
+
+        last_modified = response['Last-Modified']
+        later += datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                course.save()
+        response = self.client.get('/dashboard/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(parse_http_date(response['Last-Modified']), int(later.timestamp()))
+
+
+class RosterTests(TestCase):
+    def test_reading_leaves_the_file_open(self):
+        roster = io.BytesIO(b'Student ID,National ID\nR1,NID-R1\n')
+        self.assertEqual(read_roster_rows(roster, 'roster.csv'), [{'student_id': 'R1', 'national_id': 'NID-R1'}])
+        self.assertFalse(roster.closed)
+
+    def test_duplicate_student_ids_are_rejected(self):
+        make_student(make_stream(), 'S1')
+        result = import_roster([
+            {'student_id': 'S1', 'national_id': 'NID-X'},
+            {'student_id': 'R1', 'national_id': 'NID-R1'},
+            {'student_id': 'R1', 'national_id': 'NID-R2'},
+            {'student_id': 'R2', 'national_id': 'NID-S1'},
+        ])
+        self.assertEqual([student.student_id for student in result['created']], ['R1'])
+        self.assertEqual((result['duplicates'], result['skipped']), ([2, 4], 1))
+        self.assertEqual(Student.objects.filter(student_id='S1').count(), 1)
+
+
+@plain_static_files
+class MarkAuditTests(TestCase):
+    def test_history_outlives_the_student_and_course(self):
+        student = make_student(make_stream(), 'S1')
+        course = Course.objects.create(code='MAT', name='Mathematics')
+        mark = Mark.objects.create(student=student, course=course, mark=Decimal('55'))
+        MarkAudit.entry_for(mark, MarkAudit.CREATED).save()
+        student_id, course_id = student.pk, course.pk
+        student.delete()
+        course.delete()
+
+        entry = MarkAudit.objects.get()
+        self.assertEqual((entry.student_id, entry.course_id), (student_id, course_id))
+        self.assertEqual(list(MarkAudit.objects.for_student(student_id).values_list('pk', flat=True)), [entry.pk])
+
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        response = self.client.get('/admin/base/markaudit/')
+        self.assertContains(response, f'{student_id} (deleted)')
+        self.assertContains(response, f'{course_id} (deleted)')
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        student = make_student(make_stream(), 'S1')
+        course = Course.objects.create(code='MAT', name='Mathematics')
+        student.courses.add(course)
+        Mark.objects.create(student=student, course=course, mark=Decimal('55'))
+        Mark.objects.create(student=student, course=course, mark=Decimal('60'), sync_ref=uuid.uuid4())
+
+    def test_restore_counts_inserted_rows_only(self):
+        manifest = transfer.dump(self.directory)
+        self.assertEqual({t['table']: t['rows'] for t in manifest['tables']}['base_student_courses'], 1)
+        loaded = transfer.restore(self.directory)
+        # Students, courses, links and the synced mark already exist; the other mark is copied
+        self.assertEqual((loaded['base_student'], loaded['base_course'], loaded['base_student_courses']), (0, 0, 0))
+        self.assertEqual(loaded['base_mark'], 1)
+        self.assertEqual(Mark.objects.count(), 3)
+
+    def test_a_dump_is_loaded_once(self):
+        transfer.dump(self.directory)
+        transfer.restore(self.directory)
+        with self.assertRaisesRegex(ValueError, 'already loaded'):
+            transfer.restore(self.directory)
+        self.assertEqual(Mark.objects.count(), 3)
+
+    def test_failed_restore_leaves_nothing(self):
+        transfer.dump(self.directory)
+        audit_file = os.path.join(self.directory, 'base_markaudit.jsonl.gz')
+        os.replace(audit_file, audit_file + '.bak')
+        with gzip.open(audit_file, 'wt') as f:
+            f.write('not json\n')
+        with self.assertRaises(ValueError):
+            transfer.restore(self.directory)
+        self.assertEqual((Mark.objects.count(), RestoredDump.objects.count()), (2, 0))
+
+        os.replace(audit_file + '.bak', audit_file)
+        self.assertEqual(transfer.restore(self.directory)['base_mark'], 1)
+
+    def test_auto_dates_are_restored_after_a_failed_restore(self):
+        field = Course._meta.get_field('updated_at')
+        with self.assertRaises(RuntimeError), transfer._preserve_auto_dates([Course]):
+            self.assertFalse(field.auto_now)
+            raise RuntimeError
+        self.assertTrue(field.auto_now)
+
+    def test_loadmarks_notifies_dashboards(self):
+        transfer.dump(self.directory)
+        versions = marks_version(), records_version()
+        with mock.patch('base.changes.publish_marks_change') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('loadmarks', self.directory, stdout=io.StringIO())
+        self.assertNotEqual(marks_version(), versions[0])
+        self.assertNotEqual(records_version(), versions[1])
+        publish.assert_called_once()
+
+
+class QueryPlanTests(TestCase):
+    def test_failed_explain_is_recorded_per_query(self):
+        make_student(make_stream(), 'S1')
+        explain = _Explainer.explain
+
+        def fail_first(explainer, sql):
+            if not calls:
+                calls.append(sql)
+                raise DatabaseError('cannot explain')
+            return explain(explainer, sql)
+
+        calls = []
+        with mock.patch.object(_Explainer, 'explain', autospec=True, side_effect=fail_first):
+            scenario = capture(['dashboard'])['scenarios']['dashboard']
+        self.assertIsNone(scenario['error'])
+        first, *others = scenario['queries']
+        self.assertEqual(first['error'], 'DatabaseError: cannot explain')
+        self.assertTrue(others)
+        self.assertTrue(all(query['plan'] for query in others))
+
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        self.stream = make_stream()
+        self.s1, self.s2 = make_student(self.stream, 'S1'), make_student(self.stream, 'S2')
+        make_student(make_stream('Form 2'), 'S3')
+        self.mat = Course.objects.create(code='MAT', name='Mathematics')
+        self.eng = Course.objects.create(code='ENG', name='English')
+        test = Assessment.objects.create(course=self.mat, name='Test', kind=Assessment.TEST, weight=30, max_mark=20)
+        exam = Assessment.objects.create(course=self.mat, name='Exam', kind=Assessment.EXAM, weight=70)
+        for student, course, assessment, mark in [
+            (self.s1, self.mat, test, 10), (self.s1, self.mat, exam, 80), (self.s2, self.mat, exam, 60),
+            (self.s1, self.eng, None, 70), (self.s1, self.eng, None, 80),
+        ]:
+            Mark.objects.create(student=student, course=course, assessment=assessment, mark=mark)
+
+    def test_cells_are_weighted_percentages(self):
+        gradebook = Gradebook.for_stream(self.stream)
+        self.assertEqual(gradebook.shape, (2, 2))
+        self.assertEqual([code for _, code in gradebook.courses], ['ENG', 'MAT'])
+        # (10/20 * 30 + 80 * 70) / 100
+        self.assertAlmostEqual(gradebook.get(self.s1.pk, self.mat.pk), 71.0)
+        self.assertEqual(gradebook.get(self.s1.pk, self.eng.pk), 75.0)
+        self.assertIsNone(gradebook.get(self.s2.pk, self.eng.pk))
+        self.assertEqual(gradebook.missing(), 1)
+
+        exams = Gradebook.for_stream(self.stream, kind=Assessment.EXAM)
+        self.assertEqual(exams.column(self.mat.pk), [80.0, 60.0])
+
+    def test_select_and_statistics(self):
+        gradebook = Gradebook.for_stream(self.stream)
+        part = gradebook.select(students=[self.s2.pk], courses=[self.mat.pk, self.eng.pk])
+        self.assertEqual(part.row(self.s2.pk), [60.0, None])
+
+        mat = gradebook.column_stats()[self.mat.pk]
+        self.assertEqual((mat['count'], mat['lowest'], mat['highest']), (2, 60.0, 71.0))
+        self.assertAlmostEqual(mat['average'], 65.5)
+        self.assertAlmostEqual(mat['stdev'], 5.5)
+        self.assertEqual(gradebook.row_stats()[self.s2.pk]['count'], 1)
+        self.assertIsNone(part.column_stats()[self.eng.pk]['average'])
+
+    def test_exports(self):
+        gradebook = Gradebook.for_stream(self.stream)
+        data = gradebook.to_dict()
+        self.assertEqual(data['marks'], [[75.0, 71.0], [None, 60.0]])
+        self.assertEqual(data['courses'][1]['average'], 65.5)
+        self.assertEqual(data['missing'], 1)
+
+        out = io.StringIO()
+        gradebook.write_csv(out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Student ID,Name,ENG,MAT', 'S1,Student S1,75.00,71.00', 'S2,Student S2,,60.00',
+        ])
+
+    def test_stream_gradebook_view(self):
+        url = f'/streams/{self.stream.pk}/gradebook/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username='teacher', password='secret'))
+        data = self.client.get(url).json()
+        self.assertEqual((data['stream'], data['marks']), ('Form 1', [[75.0, 71.0], [None, 60.0]]))
+        self.assertEqual(self.client.get(url, {'kind': 'E'}).json()['marks'], [[80.0], [60.0]])
+
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="form-1-gradebook.csv"')
+        self.assertEqual(response.content.decode().splitlines()[0], 'Student ID,Name,ENG,MAT')
+        self.assertEqual(self.client.get('/streams/999/gradebook/').status_code, 404)
+
+
+class DashboardEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='teacher', password='secret')
+
+    def first_event(self):
+        request = RequestFactory().get('/dashboard/events/')
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+
+        async def read():
+            response = await dashboard_events(request)
+            events = response.streaming_content
+            try:
+                return await anext(events)
+            finally:
+                await events.aclose()
+        data = [line for line in async_to_sync(read)().splitlines() if line.startswith(b'data: ')]
+        return json.loads(data[0].removeprefix(b'data: '))
+
+    def test_marks_created_from_strings(self):
+        student = make_student(make_stream(), 'S1')
+        course = Course.objects.create(code='MAT', name='Mathematics')
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark.objects.create(student=student, course=course, mark='55.5')
+        delta = marks_delta([Mark(mark='60'), Mark(mark=Decimal('40.25'))])
+        self.assertEqual((delta['count'], delta['sum'], delta['highest_mark'], delta['lowest_mark']),
+                         (2, 100.25, 60.0, 40.25))
+
+    def test_dashboards_require_login(self):
+        for url in ('/dashboard/', '/dashboard/events/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302, url)
+            self.assertTrue(response['Location'].startswith(settings.LOGIN_URL))
+
+    def test_snapshot_carries_the_marks_version_it_counts(self):
+        make_student(make_stream(), 'S1')
+        statistics = mark_statistics
+
+        def change_during_snapshot():
+            # A change committed while the statistics are read
+            if not mark_statistics_calls:
+                bump_marks_version()
+            mark_statistics_calls.append(1)
+            return statistics()
+
+        mark_statistics_calls = []
+        with mock.patch('base.mark_views.mark_statistics', side_effect=change_during_snapshot):
+            event = self.first_event()
+        self.assertEqual(len(mark_statistics_calls), 2)
+        self.assertEqual(event['version'], marks_version())
+        self.assertEqual(event['total_students'], 1)
+
+
+@plain_static_files
+class MarkUploadTests(TestCase):
+    # Stored files are shared by every database
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        make_student(make_stream(), 'S1')
+        Course.objects.create(code='MAT', name='Mathematics')
+
+    def sheet(self):
+        return SimpleUploadedFile('marks.csv', b'student_id,course_code,mark\nS1,MAT,55\n')
+
+    def test_same_sheet_is_imported_once(self):
+        upload, created = store_upload(self.sheet())
+        self.assertTrue(created)
+        self.assertEqual(import_upload(upload)['created'], 1)
+
+        again, created = store_upload(self.sheet())
+        self.assertEqual((again, created), (upload, False))
+        report = import_upload(again)
+        self.assertEqual((report['created'], report['already_imported']), (0, 1))
+        self.assertEqual(Mark.objects.count(), 1)
+
+        self.assertEqual(import_upload(again, reimport=True)['created'], 1)
+        self.assertEqual(Mark.objects.count(), 2)
+
+    def test_upload_view_skips_a_sheet_imported_before(self):
+        self.client.force_login(User.objects.create_user(username='teacher', password='secret'))
+        self.client.post('/upload/', {'file': self.sheet()})
+        response = self.client.post('/upload/', {'file': self.sheet()})
+        self.assertIn('already imported', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+        self.assertEqual(Mark.objects.count(), 1)
+        self.client.post('/upload/', {'file': self.sheet(), 'reimport': 'on'})
+        self.assertEqual(Mark.objects.count(), 2)
+
+    def test_compressed_sheet_is_still_importable(self):
+        upload, _ = store_upload(self.sheet())
+        compress_upload(upload)
+        self.assertFalse(default_storage.exists(upload_path(upload.sha256)))
+        self.assertEqual(import_upload(upload)['created'], 1)
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.enterContext(override_settings(STATIC_ROOT=self.root))
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(content)
+
+    def get(self, path, accept_encoding=''):
+        response = serve_static(RequestFactory().get(f'/static/{path}', HTTP_ACCEPT_ENCODING=accept_encoding), path)
+        self.addCleanup(response.close)
+        return response
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, deflate, br'), {'gzip', 'deflate', 'br'})
+        self.assertEqual(accepted_encodings('br;q=0, gzip;q=0.5'), {'gzip'})
+        self.assertEqual(accepted_encodings('GZIP;Q=0.0'), set())
+        self.assertEqual(accepted_encodings('*, br;q=0'), {'*', 'gzip'})
+        self.assertEqual(accepted_encodings(''), set())
+
+    def test_precompressed_variant_is_chosen(self):
+        self.write('app.0123456789ab.js', b'plain')
+        self.write('app.0123456789ab.js.gz', gzip.compress(b'plain'))
+        response = self.get('app.0123456789ab.js', 'br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'plain')
+
+        for header in ('', 'gzip;q=0', 'identity'):
+            response = self.get('app.0123456789ab.js', header)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(b''.join(response.streaming_content), b'plain')
+
+    def test_cache_control_depends_on_the_hash(self):
+        self.write('app.0123456789ab.css', b'body {}')
+        self.write('app.css', b'body {}')
+        self.assertEqual(self.get('app.0123456789ab.css')['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.get('app.css')['Cache-Control'], 'public, max-age=300')
+
+    def test_paths_outside_static_root_are_not_served(self):
+        for path in ('../settings.py', '/etc/passwd', 'missing.css', ''):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        storage = PrecompressedManifestStaticFilesStorage(location=self.root)
+        self.write('app.css', b'body { color: red; }')
+        self.write('logo.png', b'PNG')
+        list(storage.post_process({name: (storage, name) for name in ('app.css', 'logo.png')}))
+
+        hashed = storage.stored_name('app.css')
+        self.assertRegex(hashed, r'^app\.[0-9a-f]{12}\.css$')
+        with open(storage.path(hashed) + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), b'body { color: red; }')
+        self.assertFalse(os.path.exists(storage.path(storage.stored_name('logo.png')) + '.gz'))
+        self.assertEqual(os.path.exists(storage.path(hashed) + '.br'), brotli is not None)
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | io
+import time:        80 |         80 |     encodings.aliases
+import time:       200 |        280 |   encodings
+Warning: something unrelated on stderr
+import time:      1000 |       1280 | django
+"""
+
+
+class ProfileStartupTests(unittest.TestCase):
+    def test_parse_importtime(self):
+        modules, total = parse_importtime(IMPORTTIME_OUTPUT)
+        self.assertEqual(modules, [
+            ('_io', 120, 120), ('io', 300, 420), ('encodings.aliases', 80, 80),
+            ('encodings', 200, 280), ('django', 1000, 1280),
+        ])
+        # Only top-level imports count towards the total
+        self.assertEqual(total, 420 + 1280)
+        self.assertEqual(parse_importtime(''), ([], 0))
+
+
+class MarkUploadMigrationTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, self.executor.loader.graph.leaf_nodes('base'))
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def test_per_mark_files_are_moved_and_deleted(self):
+        apps = self.migrate([('base', '0007_markaudit')])
+        Stream, Course, Student, Mark = (apps.get_model('base', name) for name in ('Stream', 'Course', 'Student', 'Mark'))
+        AddressZW = apps.get_model('base', 'AddressZW')
+        stream = Stream.objects.create(name='Form 1', start_date=datetime.date(2026, 1, 1),
+                                       end_date=datetime.date(2026, 12, 1))
+        address = AddressZW.objects.create(address_line_1='1 Main Road', city='Harare', province='Harare',
+                                           postal_code='0000')
+        course = Course.objects.create(code='MAT', name='Mathematics')
+        names = [default_storage.save(f'uploads/2026/01/0{day}/marks.csv', io.BytesIO(b'S1,MAT,55\n'))
+                 for day in (1, 2)]
+        for number, name in enumerate(names):
+            student = Student.objects.create(
+                student_id=f'S{number}', first_name='Student', last_name='One', gender='F',
+                national_id=f'NID-{number}', address=address, phone_number='0770000000', parent_name='Parent',
+                parent_phone_number='0770000001', class_year=stream,
+            )
+            Mark.objects.create(student=student, course=course, mark=55, file_upload=name)
+
+        apps = self.migrate([('base', '0008_mark_upload')])
+        upload = apps.get_model('base', 'MarkUpload').objects.get()
+        self.assertEqual(apps.get_model('base', 'Mark').objects.filter(upload=upload).count(), 2)
+        self.assertTrue(default_storage.exists(upload.file.name))
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+
+class MarkImportTests(TestCase):
+    def setUp(self):
+        self.stream = make_stream()
+        make_student(self.stream, 'S1')
+        Course.objects.create(code='MAT', name='Mathematics')
+
+    def test_ambiguous_student_ids_are_rejected(self):
+        Student.objects.filter(pk=make_student(make_stream('Form 2'), 'S2').pk).update(student_id='S1')
+        report = import_mark_rows(parse_mark_rows(['S1,MAT,55']))
+        self.assertEqual(report['errors'], [(1, 'Student id S1 is shared by several students')])
+        self.assertFalse(Mark.objects.exists())
+
+    def test_failed_sheet_keeps_no_marks(self):
+        def rows():
+            yield from parse_mark_rows(['S1,MAT,55', 'S1,MAT,60'])
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        with self.assertRaises(UnicodeDecodeError):
+            import_mark_rows(rows(), batch_size=1)
+        self.assertFalse(Mark.objects.exists())
+
+    def test_worker_pool_imports_and_notifies_from_the_parent(self):
+        class InlinePool:
+            # Runs the workers in this process, inside the test's transaction
+            def __init__(self, max_workers, initializer):
+                pool_sizes.append(max_workers)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            map = staticmethod(map)
+
+        pool_sizes = []
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, rows in (('maths.csv', 'S1,MAT,55\nS1,MAT,61\n'), ('late.csv', 'S1,MAT,70\n'), ('bad.csv', 'S9,MAT,1\n')):
+            with open(os.path.join(directory.name, name), 'w') as f:
+                f.write(rows)
+        connections = mock.MagicMock()
+        connections.__getitem__.return_value.vendor = 'postgresql'
+        with mock.patch('base.marks_import.ProcessPoolExecutor', InlinePool), \
+                mock.patch('base.marks_import.connections', connections), \
+                mock.patch('base.marks_import.marks_changed') as marks_changed:
+            report = import_mark_files(directory.name, workers=8)
+
+        self.assertEqual(pool_sizes, [3])
+        self.assertEqual((report['created'], report['errors'], report['workers']), (3, 1, 3))
+        self.assertEqual(Mark.objects.count(), 3)
+        self.assertEqual(marks_changed.call_args_list[-1], mock.call())
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+    def test_sqlite_imports_in_one_process(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name in ('a.csv', 'b.csv'):
+            with open(os.path.join(directory.name, name), 'w') as f:
+                f.write('S1,MAT,55\n')
+        with mock.patch('base.marks_import.ProcessPoolExecutor') as pool:
+            report = import_mark_files(directory.name, workers=2)
+        pool.assert_not_called()
+        self.assertEqual((report['created'], report['workers']), (2, 1))
+
+    def test_import_endpoint(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('maths.csv', 'student_id,course_code,mark\nS1,MAT,55\nS1,MAT,61\n')
+            zf.writestr('english.csv', 'S1,ENG,70\n')
+        self.assertEqual(self.client.post('/marks/import/').status_code, 401)
+
+        self.client.force_login(User.objects.create_user(username='teacher', password='secret'))
+        response = self.client.post('/marks/import/', {
+            'file': SimpleUploadedFile('term.zip', archive.getvalue()), 'workers': '1',
+        })
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created'], report['errors']), (2, 1))
+        self.assertEqual(sorted((f['file'], f['created']) for f in report['files']),
+                         [('english.csv', 0), ('maths.csv', 2)])
+
+        response = self.client.post('/marks/import/', {'file': SimpleUploadedFile('term.zip', b'not a zip')})
+        self.assertEqual(response.status_code, 400)
+
+
+@requires_shards
+class SharedUploadStorageTests(TestCase):
+    databases = SHARD_DATABASES
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.uploads = {}
+        for code in SHARDS:
+            school = School.objects.create(code=code, name=code, database=code)
+            with use_school(school):
+                make_student(make_stream(), 'S1')
+                Course.objects.create(code='MAT', name='Mathematics')
+                self.uploads[code], _ = store_upload(
+                    SimpleUploadedFile('marks.csv', b'student_id,course_code,mark\nS1,MAT,55\n'),
+                )
+
+    def test_compressing_in_one_school_keeps_the_file_of_another(self):
+        north, south = self.uploads['north'], self.uploads['south']
+        self.assertEqual(north.file.name, south.file.name)
+        with use_school('north'):
+            compress_upload(north)
+        self.assertTrue(default_storage.exists(south.file.name))
+        with use_school('south'):
+            self.assertEqual(import_upload(south)['created'], 1)
+            compress_upload(south)
+        self.assertFalse(default_storage.exists(upload_path(south.sha256)))
+        with use_school('north'):
+            self.assertEqual(import_upload(north)['created'], 1)
+
+
+class SyncMarksTests(TestCase):
+    def setUp(self):
+        self.stream = make_stream()
+        make_student(self.stream, 'S1')
+        make_student(make_stream('Form 2'), 'S2')
+        Course.objects.create(code='MAT', name='Mathematics')
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(User.objects.create_user(username='teacher', password='secret'))
+        self.csrf_token = self.client.get('/sync/marks/').json()['csrf_token']
+        self.enterContext(mock.patch('base.sync.SETTLE_SECONDS', 0))
+
+    def sync(self, changes=(), token=None, **payload):
+        response = self.client.post(
+            '/sync/marks/', json.dumps({'stream': self.stream.pk, 'token': token, 'changes': list(changes), **payload}),
+            content_type='application/json', HTTP_X_CSRFTOKEN=self.csrf_token,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def create(self, mark=60, ref=None):
+        return {'ref': ref or str(uuid.uuid4()), 'student': 'S1', 'course': 'MAT', 'mark': mark}
+
+    def test_authentication_and_csrf_errors_are_json(self):
+        anonymous = Client(enforce_csrf_checks=True)
+        response = anonymous.post('/sync/marks/', '{}', content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['error']), (401, 'Authentication required'))
+        response = self.client.post('/sync/marks/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['error'])
+
+    def test_full_download_and_created_marks(self):
+        change = self.create()
+        result = self.sync([change, {**self.create(), 'student': 'S2'}])
+        mark_id, version = result['applied']['created'][change['ref']]
+        self.assertTrue(result['reset'])
+        self.assertEqual(result['marks'], [[mark_id, 'S1', 'MAT', None, '60.00', version]])
+        self.assertEqual(result['errors'][0]['error'], 'Unknown student S2 in this stream')
+
+    def test_retried_creates_return_the_first_marks(self):
+        change = self.create()
+        first = self.sync([change])
+        second = self.sync([change], token=first['token'])
+        self.assertEqual(second['applied']['created'], first['applied']['created'])
+        self.assertEqual(Mark.objects.count(), 1)
+        self.assertEqual(MarkAudit.objects.count(), 1)
+
+    def test_stale_update_is_a_conflict(self):
+        change = self.create()
+        result = self.sync([change])
+        mark_id, version = result['applied']['created'][change['ref']]
+        token = result['token']
+
+        updated = self.sync([{'id': mark_id, 'version': version, 'mark': 70}], token=token)
+        self.assertEqual(list(updated['applied']['updated']), [str(mark_id)])
+        stale = self.sync([{'id': mark_id, 'version': version, 'deleted': True}], token=token)
+        self.assertEqual(stale['conflicts'][0]['reason'], 'changed')
+        self.assertEqual(stale['conflicts'][0]['server'][4], '70.00')
+        self.assertTrue(Mark.objects.filter(pk=mark_id).exists())
+
+    def test_delta_feed_lists_changes_and_deletions(self):
+        first, second = self.create(50), self.create(55)
+        result = self.sync([first, second])
+        token = result['token']
+        (first_id, first_version), (second_id, _) = result['applied']['created'].values()
+        other_device = self.sync([{'id': first_id, 'version': first_version, 'deleted': True}], token=token)
+        self.assertEqual(other_device['applied']['deleted'], [first_id])
+        Mark.objects.filter(pk=second_id).update(mark=90)
+        MarkAudit.entry_for(Mark.objects.get(pk=second_id), MarkAudit.UPDATED, old_value=Decimal('55')).save()
+
+        feed = self.sync(token=token)
+        self.assertFalse(feed['reset'])
+        self.assertEqual(feed['removed'], [first_id])
+        self.assertEqual([row[4] for row in feed['marks']], ['90.00'])
+
+    def test_malformed_changes_are_reported(self):
+        result = self.sync([
+            {'id': [1], 'version': 1, 'mark': 3},
+            {'ref': str(uuid.uuid4()), 'student': ['S1'], 'course': 'MAT', 'mark': 1},
+            {'ref': 'not-a-uuid', 'student': 'S1', 'course': 'MAT', 'mark': 1},
+            self.create(mark=[5]),
+            'junk',
+        ])
+        self.assertEqual([error.get('index') for error in result['errors'][:4]], [0, 1, 2, 4])
+        self.assertIn('Invalid mark value', result['errors'][4]['error'])
+        self.assertFalse(Mark.objects.exists())
+
+    def test_malformed_requests_are_rejected(self):
+        for body in ('[]', '{"stream": "x"}', '{"stream": 1, "changes": 3}', '{"stream": 1, "courses": [1]}', 'nope'):
+            response = self.client.post('/sync/marks/', body, content_type='application/json',
+                                        HTTP_X_CSRFTOKEN=self.csrf_token)
+            self.assertEqual(response.status_code, 400, body)
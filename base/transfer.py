@@ -0,0 +1,480 @@
+"""
+Streamed bulk dump and restore of the base app's tables.
+
+A dump is a directory holding a manifest.json and one gzip-compressed file per
+table. Two formats are supported:
+
+- ``jsonl``: a JSON array of column values per line. Restoring assigns new
+  primary keys and remaps every foreign key, so a dump can be loaded into a
+  database that already holds other data.
+- ``copy``: PostgreSQL COPY text format. Rows are copied verbatim, ids
+  included, so the target tables must be empty. It is the fastest option for
+  cloning an environment.
+
+Users are not dumped. References to auth users are carried by username and
+resolved against the target database's existing accounts.
+
+Both directions work on the active school's database unless a database alias
+is given, which is how schools are moved between databases.
+
+A dump reads every table from one snapshot. On PostgreSQL the snapshot of a
+REPEATABLE READ transaction is exported and imported by each thread dumping
+tables concurrently; other databases dump the tables one after another in a
+single transaction.
+"""
+import contextlib
+import datetime
+import decimal
+import gzip
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import (
+    AddressZW, Assessment, Course, FinalGrade, Mark, MarkAudit, MarkUpload, Program, RestoredDump, Stream, Student,
+    Teacher,
+)
+from .sharding import is_sharded, school_database
+
+BATCH_SIZE = 5000
+FORMATS = ('jsonl', 'copy')
+
+
+def transfer_models(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the models included in a dump, parents before children.
+    Teachers only live in the default database and are left out for any other.
+    """
+    models = [
+        AddressZW, Stream, Course, Assessment, Program, Program.courses.through, MarkUpload,
+        Student, Student.courses.through, Teacher, Mark, MarkAudit, FinalGrade,
+    ]
+    if using != DEFAULT_DB_ALIAS:
+        return [model for model in models if is_sharded(model)]
+    return models
+
+
+def table_name(model):
+    return model._meta.db_table
+
+
+def _columns(model):
+    return [field for field in model._meta.concrete_fields]
+
+
+def _foreign_keys(model):
+    return {field.attname: field.related_model for field in model._meta.concrete_fields if field.is_relation}
+
+
+def dependency_levels(models):
+    """
+    Groups models into levels; every model only references models in earlier levels.
+    Tables in the same level can be loaded in parallel.
+    """
+    included = set(models)
+    levels = []
+    placed = set()
+    remaining = list(models)
+    while remaining:
+        level = [
+            model for model in remaining
+            if all(related in placed or related not in included or related is model
+                   for related in _foreign_keys(model).values())
+        ]
+        if not level:
+            raise ValueError('Circular foreign keys between dumped tables')
+        levels.append(level)
+        placed.update(level)
+        remaining = [model for model in remaining if model not in placed]
+    return levels
+
+
+def _encode(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _close_thread_connections(fn):
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+def _run_levels(levels, task, jobs):
+    """
+    Runs ``task(model)`` for every model, level by level, with up to ``jobs`` threads per level.
+    Each thread uses its own database connection.
+    """
+    results = {}
+    for level in levels:
+        if jobs > 1 and len(level) > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                for model, result in zip(level, pool.map(_close_thread_connections(task), level)):
+                    results[model] = result
+        else:
+            for model in level:
+                results[model] = task(model)
+    return results
+
+
+# Dump
+
+def dump(directory, fmt='jsonl', jobs=1, using=None):
+    """
+    Writes every base table to ``directory``, streaming rows from the database.
+    Parameters:
+        - directory (str): Output directory (created if needed).
+        - fmt (str): "jsonl" or "copy".
+        - jobs (int): Number of tables dumped concurrently.
+        - using (str): Database alias to read (default: the active school's database).
+    Returns the manifest dict written alongside the data.
+    """
+    using = using or school_database()
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt}')
+    if fmt == 'copy' and connections[using].vendor != 'postgresql':
+        raise ValueError('The copy format requires PostgreSQL')
+    os.makedirs(directory, exist_ok=True)
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or connection.in_atomic_block:
+        # Only a transaction started by the dump can share its snapshot with threads
+        jobs = 1
+
+    models = transfer_models(using)
+    dump_table = _dump_copy if fmt == 'copy' else _dump_jsonl
+    with _snapshot(using) as snapshot_id:
+        def dump_in_snapshot(model):
+            if snapshot_id is None or connections[using].in_atomic_block:
+                return dump_table(model, directory, using)
+            # A worker thread: read the snapshot of the dump's transaction
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot_id])
+                return dump_table(model, directory, using)
+
+        counts = _run_levels([models], dump_in_snapshot, jobs)
+        users = _dump_users(models, using)
+
+    manifest = {
+        'id': uuid.uuid4().hex,
+        'format': fmt,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'tables': [
+            {
+                'model': model._meta.label,
+                'table': table_name(model),
+                'file': _data_file(model, fmt),
+                'columns': [field.attname for field in _columns(model)],
+                'rows': counts[model],
+            }
+            for model in models
+        ],
+        'users': users,
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+@contextlib.contextmanager
+def _snapshot(using):
+    """
+    Runs the block in one transaction whose snapshot all reads of the dump share.
+    Yields the exported snapshot id on PostgreSQL, None elsewhere or when the
+    caller's transaction is already open (its isolation level then applies).
+    """
+    connection = connections[using]
+    outer = connection.in_atomic_block
+    with transaction.atomic(using=using):
+        if connection.vendor != 'postgresql' or outer:
+            yield None
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute('SELECT pg_export_snapshot()')
+            snapshot_id = cursor.fetchone()[0]
+        yield snapshot_id
+
+
+def _data_file(model, fmt):
+    return f"{table_name(model)}.{'copy' if fmt == 'copy' else 'jsonl'}.gz"
+
+
+def _dump_jsonl(model, directory, using):
+    columns = [field.attname for field in _columns(model)]
+    rows = model._base_manager.using(using).order_by('pk').values_list(*columns).iterator(chunk_size=BATCH_SIZE)
+    count = 0
+    with gzip.open(os.path.join(directory, _data_file(model, 'jsonl')), 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, default=_encode, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def _dump_copy(model, directory, using):
+    connection = connections[using]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in _columns(model))
+    sql = f'COPY (SELECT {columns} FROM {connection.ops.quote_name(table_name(model))} ORDER BY 1) TO STDOUT'
+    with gzip.open(os.path.join(directory, _data_file(model, 'copy')), 'wb') as f:
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(sql, f)
+            return cursor.cursor.rowcount
+
+
+def _dump_users(models, using):
+    """
+    Returns {user id: username} for every user referenced by the dumped tables.
+    """
+    User = get_user_model()
+    user_ids = set()
+    for model in models:
+        for attname, related in _foreign_keys(model).items():
+            if related is User:
+                user_ids.update(
+                    model._base_manager.using(using).exclude(**{attname: None}).values_list(attname, flat=True)
+                )
+    users = User._default_manager.filter(pk__in=user_ids).values_list('pk', User.USERNAME_FIELD)
+    return {str(pk): username for pk, username in users}
+
+
+# Restore
+
+@contextlib.contextmanager
+def _preserve_auto_dates(models):
+    """
+    Temporarily stops auto_now/auto_now_add from overwriting dumped timestamps.
+    """
+    saved = []
+    try:
+        for model in models:
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                    saved.append((field, field.auto_now, field.auto_now_add))
+                    field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def restore(directory, jobs=1, stdout=None, using=None):
+    """
+    Loads a dump written by ``dump``.
+    Parameters:
+        - directory (str): Dump directory containing manifest.json.
+        - jobs (int): Number of tables loaded concurrently within a dependency level.
+        - stdout: Optional stream for progress messages.
+        - using (str): Database alias to load into (default: the active school's database).
+    Returns a dict of {table: rows inserted}; rows matched to existing ones
+    (by natural key, or link rows already present) are not counted.
+    Raises ValueError when the dump was loaded into the database before.
+    """
+    using = using or school_database()
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    models_by_label = {model._meta.label: model for model in transfer_models(using)}
+    tables = {models_by_label[t['model']]: t for t in manifest['tables'] if t['model'] in models_by_label}
+    if connections[using].vendor == 'sqlite':
+        # SQLite allows one writer at a time.
+        jobs = 1
+
+    def load():
+        if manifest['format'] == 'copy':
+            return _restore_copy(directory, tables, jobs, stdout, using)
+        return _restore_jsonl(directory, tables, manifest.get('users', {}), jobs, stdout, using)
+
+    if jobs == 1:
+        # One transaction, so a failed restore leaves nothing behind
+        with transaction.atomic(using=using):
+            record = _record_restore(manifest, using)
+            loaded = load()
+            _complete_restore(record, using)
+        return loaded
+
+    # Threads load tables in transactions of their own. The record is
+    # committed first, so a restore that fails part way isn't repeated blindly.
+    record = _record_restore(manifest, using)
+    loaded = load()
+    _complete_restore(record, using)
+    return loaded
+
+
+def _record_restore(manifest, using):
+    """
+    Records that a dump is being loaded, refusing one loaded before.
+    Dumps written before dump ids existed are not recorded.
+    """
+    dump_id = manifest.get('id')
+    if dump_id is None:
+        return None
+    earlier = RestoredDump.objects.using(using).filter(dump_id=dump_id).first()
+    if earlier is not None:
+        message = f'Dump {dump_id} was already loaded into {using} on {earlier.started_at:%Y-%m-%d %H:%M}'
+        if earlier.completed_at is None:
+            message += '; that restore failed part way and its rows remain'
+        raise ValueError(message)
+    return RestoredDump.objects.using(using).create(dump_id=dump_id)
+
+
+def _complete_restore(record, using):
+    if record is not None:
+        RestoredDump.objects.using(using).filter(pk=record.pk).update(completed_at=timezone.now())
+
+
+def _restore_jsonl(directory, tables, usernames, jobs, stdout, using):
+    User = get_user_model()
+    by_username = dict(User._default_manager.filter(
+        **{f'{User.USERNAME_FIELD}__in': set(usernames.values())}
+    ).values_list(User.USERNAME_FIELD, 'pk'))
+    # old id -> new id, per model; users are matched by username
+    id_maps = {User: {int(old): by_username.get(name) for old, name in usernames.items()}}
+    loaded = {}
+
+    def load(model):
+        spec = tables[model]
+        columns = spec['columns']
+        pk_name = model._meta.pk.attname
+        pk_index = columns.index(pk_name)
+        fields = {field.attname: field for field in _columns(model)}
+        # column index -> (id map of the referenced table, whether the column is nullable)
+        foreign_keys = {
+            index: (id_maps[fields[attname].related_model], fields[attname].null)
+            for index, attname in enumerate(columns)
+            if fields[attname].is_relation and fields[attname].related_model in id_maps
+        }
+        # Rows whose natural key (e.g. Course.code) already exists are mapped onto
+        # the existing row instead of being inserted again. Null keys (e.g. the
+        # sync_ref of marks not created through sync) never match.
+        natural_key = _natural_key(model, columns)
+        existing = {}
+        if natural_key is not None:
+            existing = dict(model._base_manager.using(using).exclude(**{natural_key: None})
+                            .values_list(natural_key, 'pk'))
+            natural_index = columns.index(natural_key)
+        # Link tables (e.g. student courses) are not referenced by anything else,
+        # so their new ids aren't needed and duplicates can simply be ignored.
+        link_table = model._meta.auto_created
+        manager = model._base_manager.db_manager(using)
+
+        mapping = {}
+        inserted = skipped = 0
+        batch, old_ids = [], []
+
+        def remap(row):
+            for index, (id_map, nullable) in foreign_keys.items():
+                if row[index] is not None:
+                    row[index] = id_map.get(row[index])
+                    if row[index] is None and not nullable:
+                        return False
+            return True
+
+        def flush():
+            nonlocal inserted
+            manager.bulk_create(batch, ignore_conflicts=link_table)
+            # Rows dropped by ignore_conflicts get no pk, so link tables aren't mapped
+            if not link_table:
+                for old_id, obj in zip(old_ids, batch):
+                    mapping[old_id] = obj.pk
+                inserted += len(batch)
+            batch.clear()
+            old_ids.clear()
+
+        with gzip.open(os.path.join(directory, spec['file']), 'rt', encoding='utf-8') as f, \
+                transaction.atomic(using=using):
+            before = manager.count() if link_table else 0
+            for line in f:
+                row = json.loads(line)
+                if not remap(row):
+                    skipped += 1
+                    continue
+                if natural_key is not None and row[natural_index] is not None:
+                    match = existing.get(fields[natural_key].to_python(row[natural_index]))
+                    if match is not None:
+                        mapping[row[pk_index]] = match
+                        continue
+                old_ids.append(row[pk_index])
+                values = dict(zip(columns, row))
+                del values[pk_name]
+                batch.append(model(**values))
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+            if link_table:
+                inserted = manager.count() - before
+        return mapping, inserted, skipped
+
+    with _preserve_auto_dates(tables):
+        for level in dependency_levels(list(tables)):
+            results = _run_levels([level], load, jobs)
+            for model, (mapping, inserted, skipped) in results.items():
+                id_maps[model] = mapping
+                loaded[table_name(model)] = inserted
+                if stdout:
+                    message = f'{table_name(model)}: {inserted} rows'
+                    if skipped:
+                        message += f' ({skipped} skipped, referenced rows missing)'
+                    stdout.write(message)
+    return loaded
+
+
+def _restore_copy(directory, tables, jobs, stdout, using):
+    if connections[using].vendor != 'postgresql':
+        raise ValueError('The copy format requires PostgreSQL')
+    non_empty = [table_name(model) for model in tables if model._base_manager.using(using).exists()]
+    if non_empty:
+        raise ValueError(f"COPY restore needs empty tables; these have rows: {', '.join(non_empty)}")
+
+    loaded = {}
+
+    def load(model):
+        spec = tables[model]
+        connection = connections[using]
+        columns = ', '.join(connection.ops.quote_name(c) for c in _column_names(model, spec['columns']))
+        sql = f'COPY {connection.ops.quote_name(table_name(model))} ({columns}) FROM STDIN'
+        with gzip.open(os.path.join(directory, spec['file']), 'rb') as f, transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.cursor.copy_expert(sql, f)
+                return cursor.cursor.rowcount
+
+    for level in dependency_levels(list(tables)):
+        for model, rows in _run_levels([level], load, jobs).items():
+            loaded[table_name(model)] = rows
+            if stdout:
+                stdout.write(f'{table_name(model)}: {rows} rows')
+
+    # COPY bypasses the id sequences; move them past the restored ids.
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(tables)):
+            cursor.execute(sql)
+    return loaded
+
+
+def _natural_key(model, columns):
+    """
+    Returns the first unique, non-relational column of a model (e.g. Course.code), or None.
+    """
+    for field in _columns(model):
+        if field.unique and not field.primary_key and not field.is_relation and field.attname in columns:
+            return field.attname
+    return None
+
+
+def _column_names(model, attnames):
+    by_attname = {field.attname: field.column for field in _columns(model)}
+    return [by_attname[attname] for attname in attnames]
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from .models import MarkUpload
+
+UPLOAD_ROOT = 'uploads/sha256'
+
+
+def upload_path(digest, compressed=False):
+    """
+    Builds the content-addressed storage path for a digest, e.g. uploads/sha256/ab/cd/abcd....csv
+    Parameters:
+        - digest (str): SHA-256 hex digest of the file.
+        - compressed (bool): Whether the path is for the gzip-compressed copy.
+    Returns a storage-relative path.
+    """
+    name = f'{digest}.csv.gz' if compressed else f'{digest}.csv'
+    return f'{UPLOAD_ROOT}/{digest[:2]}/{digest[2:4]}/{name}'
+
+
+def store_upload(uploaded_file, user=None):
+    """
+    Stores an uploaded mark sheet once, keyed by the hash of its content.
+    The file is hashed chunk by chunk; uploading a file whose content is
+    already stored returns the existing record without writing it again.
+    Parameters:
+        - uploaded_file (UploadedFile): File received from the request.
+        - user (User): User who uploaded the file.
+    Returns a tuple (MarkUpload, created).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    digest = digest.hexdigest()
+
+    existing = MarkUpload.objects.filter(sha256=digest).first()
+    if existing is not None:
+        return existing, False
+
+    name = upload_path(digest)
+    if not default_storage.exists(name):
+        uploaded_file.seek(0)
+        name = default_storage.save(name, uploaded_file)
+
+    try:
+        with transaction.atomic(using=router.db_for_write(MarkUpload)):
+            upload = MarkUpload.objects.create(
+                sha256=digest,
+                file=name,
+                original_name=os.path.basename(uploaded_file.name),
+                size=size,
+                uploaded_by=user if user is not None and user.is_authenticated else None,
+            )
+    except IntegrityError:
+        # Someone stored the same sheet concurrently.
+        return MarkUpload.objects.get(sha256=digest), False
+    return upload, True
+
+
+def compress_upload(upload):
+    """
+    Replaces a stored sheet with a gzip-compressed copy.
+    The file is compressed in a streaming fashion through a temporary file.
+    Parameters:
+        - upload (MarkUpload): Upload to compress.
+    Returns True if the upload was compressed, False if it already was.
+    """
+    if upload.compressed:
+        return False
+
+    old_name = upload.file.name
+    with tempfile.TemporaryFile() as tmp:
+        with default_storage.open(old_name, 'rb') as src, gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            for chunk in iter(lambda: src.read(64 * 1024), b''):
+                gz.write(chunk)
+        tmp.seek(0)
+        new_name = upload_path(upload.sha256, compressed=True)
+        if default_storage.exists(new_name) and not is_referenced(new_name):
+            # Left over from an interrupted run
+            default_storage.delete(new_name)
+        if not default_storage.exists(new_name):
+            new_name = default_storage.save(new_name, File(tmp))
+
+    upload.file.name = new_name
+    upload.compressed = True
+    upload.save(update_fields=['file', 'compressed'])
+    if not is_referenced(old_name):
+        default_storage.delete(old_name)
+    return True
+
+
+def is_referenced(name):
+    """
+    Checks whether an upload in any database points at a stored file.
+    Storage is shared by all school databases, so the same sheet uploaded to
+    two schools is stored once and referenced from both.
+    """
+    return any(MarkUpload.objects.using(alias).filter(file=name).exists() for alias in connections)
+
+
+def compress_old_uploads(days):
+    """
+    Compresses every uncompressed sheet uploaded more than ``days`` days ago.
+    Parameters:
+        - days (int): Minimum age of the uploads to compress.
+    Returns the number of uploads compressed.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    count = 0
+    for upload in MarkUpload.objects.filter(compressed=False, uploaded_at__lt=cutoff).iterator():
+        count += compress_upload(upload)
+    return count
@@ -1,8 +1,12 @@
 from django.urls import path
 from .views import  upload_marks
-from .mark_views import DashboardView
+from .mark_views import DashboardView, dashboard_events, import_marks, stream_gradebook, sync_marks
 
 urlpatterns = [
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/events/', dashboard_events, name='dashboard_events'),
+    path('streams/<int:pk>/gradebook/', stream_gradebook, name='stream_gradebook'),
+    path('sync/marks/', sync_marks, name='sync_marks'),
+    path('marks/import/', import_marks, name='import_marks'),
     path('upload/', upload_marks, name='upload_marks'),
 ]
\ No newline at end of file
@@ -1,8 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import MarkUploadForm
-from .models import Mark, Student, Course
-import csv
+from .marks_import import import_upload
+from .uploads import store_upload
 
 def upload_marks(request):
     if request.method == 'POST':
@@ -14,26 +14,23 @@ def upload_marks(request):
                 return redirect('upload_marks')
             
             try:
-                # Process the CSV file
-                decoded_file = file.read().decode('utf-8')
-                csv_data = csv.reader(decoded_file.splitlines(), delimiter=',')
-                
+                # Store the sheet once, then stream it back in batches: student_id, course_code, mark
+                upload, _ = store_upload(file, user=request.user)
+                report = import_upload(upload, user=request.user, reimport=form.cleaned_data['reimport'])
+
+                if report.get('already_imported'):
+                    messages.info(request, f"This sheet was already imported on {upload.uploaded_at:%Y-%m-%d} "
+                                           f"({report['already_imported']} marks). Tick \"Import again\" to import it once more.")
+                    return redirect('upload_marks')
+
                 # Check if the CSV file is not empty
-                if len(list(csv_data)) < 2:
+                if not report['created'] and not report['errors']:
                     messages.error(request, 'The CSV file is empty or does not contain valid data.')
                     return redirect('upload_marks')
-                
-                # Reset the file cursor to the beginning for iteration
-                file.seek(0)
-                
-                for row in csv_data:
-                    # Assuming CSV format: student_id, course_code, mark
-                    student_id, course_code, mark_value = row
-                    student = Student.objects.get(student_id=student_id)
-                    course = Course.objects.get(code=course_code)
-                    Mark.objects.create(student=student, course=course, mark=mark_value)
-                    
-                messages.success(request, 'File uploaded successfully.')
+
+                for line, error in report['errors'][:10]:
+                    messages.warning(request, f'Line {line}: {error}')
+                messages.success(request, f"File uploaded successfully. {report['created']} marks imported.")
                 return redirect('upload_marks')
             except Exception as e:
                 messages.error(request, f'Error processing CSV file: {e}')